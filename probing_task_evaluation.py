@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, List
 
 import os
 import logging
@@ -94,6 +94,14 @@ def _get_parser():
         default="probing_task_results.json",
         help="name of the file the results are written to",
     )
+    parser.add_argument(
+        "--columns",
+        type=str,
+        nargs="*",
+        default=None,
+        help="annotation columns (ner, pos, dep, dep_head) used by the model, "
+        + "the others are not loaded (default: all)",
+    )
     parser.add_argument("--prototyping", action="store_true")
 
     parser.add_argument("--cache-representations", action="store_true")
@@ -112,6 +120,7 @@ def run_evaluation(
     prototyping: bool = False,
     cache_representations: bool = True,
     result_file_name: str = "probing_task_results.json",
+    columns: Optional[List[str]] = None,
 ):
 
     predictor = load_predictor(
@@ -210,6 +219,8 @@ def run_evaluation(
             "epoch_size": 4,
         }
 
+    params["columns"] = columns
+
     if dataset == "tacred":
         tasks = ALL_PROBING_TASKS_TACRED
     elif dataset == "semeval2010":
@@ -247,4 +258,5 @@ if __name__ == "__main__":
         prototyping=args.prototyping,
         cache_representations=args.cache_representations,
         result_file_name=args.result_file_name,
+        columns=args.columns,
     )
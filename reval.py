@@ -1,6 +1,8 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Iterable
 
+import os
 import fire
+import hashlib
 import numpy
 import logging
 from os.path import join
@@ -9,9 +11,31 @@ from collections import Counter
 from reval.datasets import (
     load_jsonl_dataset,
     load_tacred_dataset,
+    load_columnar_dataset,
     save_probing_task_dataset,
+    save_probing_task_dataset_binary,
+    binary_dataset_path,
+    save_shared_corpus,
+    save_probing_task_index,
+    shared_corpus_path,
+    task_index_path,
 )
-from reval.probing_tasks import get_probing_task_generator
+from reval.dataset_cache import load_cached_dataset, file_hash
+from reval.dataset_utils import (
+    load_datasets_concurrently,
+    persisted_train_val_split_indices,
+    select_examples,
+)
+from reval.features import FeatureTable, cached_features_path
+from reval.file_utils import COMPRESSION_SUFFIXES, strip_compression_suffix
+from reval.manifest import code_version, is_up_to_date, update_manifest
+from reval.probing_task_example import ProbingTaskExample
+from reval.probing_tasks import (
+    FEATURE_TABLE_TASKS,
+    get_probing_task_generator,
+    multi_task,
+)
+from reval.probing_tasks.probing_task_base import count_labels
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +47,150 @@ logger.addHandler(handler)
 logger.setLevel(logging.INFO)
 
 
+def load_datasets(
+    train_file: str,
+    test_file: str,
+    validation_file: Optional[str] = None,
+    dataset_format: str = "jsonl",
+    columnar: bool = False,
+    cache_dir: Optional[str] = None,
+    load_workers: int = 1,
+) -> Tuple[Any, Any, Optional[Any]]:
+    """
+    Loads the train, test and (optional) validation data, as lists of example dicts
+    or, if columnar, as ColumnarCorpus objects sharing their vocabularies.
+    """
+    dataset_loader = {"jsonl": load_jsonl_dataset, "tacred": load_tacred_dataset}.get(
+        dataset_format
+    )
+
+    if dataset_loader is None:
+        raise ValueError(f"'{dataset_format}' is not a valid dataset format.")
+
+    # vocabularies shared by all splits of a columnar corpus
+    vocabs = {}
+
+    if cache_dir:
+        load_cached = partial(
+            load_cached_dataset, dataset_format=dataset_format, cache_dir=cache_dir
+        )
+
+        def dataset_loader(file_path):
+            corpus = load_cached(file_path)
+            return corpus.with_vocabs(vocabs) if columnar else corpus.to_list()
+
+    elif columnar:
+        dataset_loader = partial(
+            load_columnar_dataset, dataset_format=dataset_format, vocabs=vocabs
+        )
+
+    if load_workers > 1:
+        file_paths = [train_file, test_file] + (
+            [validation_file] if validation_file else []
+        )
+        corpora = load_datasets_concurrently(
+            file_paths, dataset_format, cache_dir, load_workers
+        )
+        if columnar:
+            corpora = [corpus.with_vocabs(vocabs) for corpus in corpora]
+        else:
+            corpora = [corpus.to_list() for corpus in corpora]
+        train_data, test_data = corpora[:2]
+        validation_data = corpora[2] if validation_file else None
+    else:
+        train_data = dataset_loader(train_file)
+        test_data = dataset_loader(test_file)
+        validation_data = dataset_loader(validation_file) if validation_file else None
+
+    return train_data, test_data, validation_data
+
+
+def dataset_features(
+    datasets: List[Any],
+    file_paths: List[Optional[str]],
+    dataset_format: str,
+    cache_dir: Optional[str] = None,
+) -> List[Optional[FeatureTable]]:
+    """
+    Returns the FeatureTable of each dataset, None for a missing one. With a
+    cache_dir, the features are cached alongside the parsed corpora, keyed by the
+    content of the dataset files.
+    """
+    features = []
+    for data, file_path in zip(datasets, file_paths):
+        if data is None:
+            features.append(None)
+        elif cache_dir:
+            cache_path = cached_features_path(file_path, dataset_format, cache_dir)
+            features.append(FeatureTable(data, cache_path))
+        else:
+            features.append(FeatureTable(data))
+    return features
+
+
+def check_output_options(output_format: str, compression: Optional[str]) -> None:
+    if output_format not in ["tsv", "binary", "shared"]:
+        raise ValueError(f"'{output_format}' is not a valid output format.")
+
+    if compression and f".{compression}" not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"'{compression}' is not a valid compression.")
+
+
+def output_path(
+    output_file: str, output_format: str = "tsv", compression: Optional[str] = None
+) -> str:
+    """
+    Returns the path save() writes the examples of a probing task to.
+    """
+    if compression:
+        output_file = strip_compression_suffix(output_file) + f".{compression}"
+
+    if output_format == "binary":
+        return binary_dataset_path(output_file)
+    if output_format == "shared":
+        return task_index_path(output_file)
+    return output_file
+
+
+def inputs_hash(file_paths: List[Optional[str]], dataset_format: str) -> str:
+    """
+    Returns a digest of the content of the input files and the format they are
+    loaded with, which identifies the shared corpus created from them.
+    """
+    sha = hashlib.sha256(dataset_format.encode("utf-8"))
+    for file_path in file_paths:
+        sha.update((file_hash(file_path) if file_path else "-").encode("utf-8"))
+    return sha.hexdigest()
+
+
+def save(
+    output_file: str,
+    probing_task_examples: Iterable[ProbingTaskExample],
+    output_format: str = "tsv",
+    compression: Optional[str] = None,
+    datasets: Optional[List[Any]] = None,
+    datasets_hash: Optional[str] = None,
+) -> None:
+    """
+    Writes the examples of a probing task in the given output format. The "shared"
+    format additionally requires the datasets the examples were generated from, and
+    the inputs_hash() of the files they were loaded from.
+    """
+    path = output_path(output_file, output_format, compression)
+
+    if output_format == "binary":
+        save_probing_task_dataset_binary(path, probing_task_examples)
+    elif output_format == "shared":
+        id2index = save_shared_corpus(
+            shared_corpus_path(output_file),
+            [d for d in datasets if d is not None],
+            datasets_hash,
+        )
+        save_probing_task_index(path, probing_task_examples, id2index)
+    else:
+        save_probing_task_dataset(path, probing_task_examples)
+
+
 def generate(
     train_file: str,
     test_file: str,
@@ -32,32 +200,220 @@ def generate(
 ) -> None:
     dataset_format = kwargs.pop("dataset_format", "jsonl")
     validation_size = kwargs.pop("validation_size", 0.1)
-    seed = kwargs.get("seed", 1111)
+    seed = kwargs.pop("seed", 1111)
     validation_file = kwargs.pop("validation_file", None)
+    columnar = kwargs.pop("columnar", False)
+    output_format = kwargs.pop("output_format", "tsv")
+    cache_dir = kwargs.pop("cache_dir", None)
+    compression = kwargs.pop("compression", None)
+    load_workers = kwargs.pop("load_workers", 1)
+    split_file = kwargs.pop("split_file", None)
+    workers = kwargs.pop("workers", 1)
 
     numpy.random.seed(seed)
 
-    dataset_loader = {"jsonl": load_jsonl_dataset, "tacred": load_tacred_dataset}.get(
-        dataset_format
-    )
+    check_output_options(output_format, compression)
 
-    if dataset_loader is None:
-        raise ValueError(f"'{dataset_format}' is not a valid dataset format.")
+    train_data, test_data, validation_data = load_datasets(
+        train_file,
+        test_file,
+        validation_file,
+        dataset_format,
+        columnar,
+        cache_dir,
+        load_workers,
+    )
+    datasets = [train_data, validation_data, test_data]
+
+    # the tree-based tasks reuse the per-example features cached by earlier runs
+    features = None
+    if cache_dir and probing_task in FEATURE_TABLE_TASKS:
+        features = dataset_features(
+            datasets,
+            [train_file, validation_file, test_file],
+            dataset_format,
+            cache_dir,
+        )
 
-    train_data = dataset_loader(train_file)
-    test_data = dataset_loader(test_file)
-    validation_data = dataset_loader(validation_file) if validation_file else None
+    if split_file and validation_data is None:
+        train_indices, validation_indices = persisted_train_val_split_indices(
+            train_data, split_file, validation_size
+        )
+        validation_data = select_examples(train_data, validation_indices)
+        train_data = select_examples(train_data, train_indices)
+        if features is not None:
+            features[1] = features[0].select(validation_indices)
+            features[0] = features[0].select(train_indices)
 
     kwargs["validation_size"] = validation_size
     kwargs["validation_data"] = validation_data
-
+    if features is not None:
+        kwargs["features"] = features
+    # only the tasks labeled from a FeatureTable compute it in parallel
+    if probing_task in FEATURE_TABLE_TASKS:
+        kwargs["workers"] = workers
+    elif workers > 1:
+        logger.info(f"Probing task {probing_task} ignores workers={workers}")
+
+    # the examples are generated lazily and passed to the writer without building a
+    # list of them, counting the labels on the way (the binary writer still collects
+    # the task's columns before saving them)
     probing_task_generator = get_probing_task_generator(probing_task)
     probing_task_examples = probing_task_generator(train_data, test_data, **kwargs)
 
-    class_distribution = Counter([example.label for example in probing_task_examples])
+    datasets_hash = None
+    if output_format == "shared":
+        datasets_hash = inputs_hash(
+            [train_file, validation_file, test_file], dataset_format
+        )
+
+    class_distribution = Counter()
+    save(
+        output_file,
+        count_labels(probing_task_examples, class_distribution),
+        output_format,
+        compression,
+        datasets,
+        datasets_hash,
+    )
     logger.info(f"Class distribution: {class_distribution.most_common()}")
 
-    save_probing_task_dataset(output_file, probing_task_examples)
+
+def generate_tasks(
+    train_file: str,
+    test_file: str,
+    tasks: List[Dict[str, Any]],
+    validation_file: Optional[str] = None,
+    dataset_format: str = "jsonl",
+    validation_size: float = 0.1,
+    seed: int = 1111,
+    columnar: bool = False,
+    output_format: str = "tsv",
+    cache_dir: Optional[str] = None,
+    compression: Optional[str] = None,
+    load_workers: int = 1,
+    workers: int = 1,
+    split_file: Optional[str] = None,
+    force: bool = False,
+) -> None:
+    """
+    Generates the datasets of several probing tasks from a single load of the input
+    files and a single sweep over the examples. Each task is a dict holding the
+    probing_task, its output_file and the arguments of the probing task, e.g.
+    {"probing_task": "tree_depth", "output_file": "tree_depth.txt", "buckets": ...}.
+    The outputs are identical to those of one generate() call per task. With
+    workers > 1, the tasks are generated in a pool of that many processes.
+
+    A manifest next to the outputs records the input file hashes, task arguments,
+    generation options and code version each output was created from. Outputs
+    whose record is unchanged are skipped, unless force is set.
+
+    Without a validation_file, the train data is split into train and validation
+    data. If split_file is given, the split is persisted to it and reused by later
+    runs, see persisted_train_val_split().
+    """
+    check_output_options(output_format, compression)
+
+    use_split_file = split_file and not validation_file
+
+    def split_file_hash():
+        if use_split_file and os.path.exists(split_file):
+            return file_hash(split_file)
+        return None
+
+    inputs = dict(
+        train_file=file_hash(train_file),
+        validation_file=file_hash(validation_file) if validation_file else None,
+        test_file=file_hash(test_file),
+        split_file=split_file_hash(),
+    )
+    options = dict(
+        dataset_format=dataset_format,
+        validation_size=validation_size,
+        seed=seed,
+        output_format=output_format,
+        compression=compression,
+    )
+
+    pending = []
+    for task in tasks:
+        task_kwargs = {
+            key: value for key, value in task.items() if key != "output_file"
+        }
+        path = output_path(task["output_file"], output_format, compression)
+        record = dict(
+            inputs=inputs,
+            task=task_kwargs,
+            options=options,
+            code_version=code_version(),
+        )
+        up_to_date = is_up_to_date(path, record) and (
+            output_format != "shared"
+            or os.path.exists(shared_corpus_path(task["output_file"]))
+        )
+        if up_to_date and not force:
+            logger.info(f"Skipping up-to-date output: {path}")
+        else:
+            pending.append((task, path, record))
+
+    if not pending:
+        return
+
+    numpy.random.seed(seed)
+
+    train_data, test_data, validation_data = load_datasets(
+        train_file,
+        test_file,
+        validation_file,
+        dataset_format,
+        columnar,
+        cache_dir,
+        load_workers,
+    )
+    datasets = [train_data, validation_data, test_data]
+
+    # per-example features, cached alongside the parsed corpora
+    features = dataset_features(
+        datasets, [train_file, validation_file, test_file], dataset_format, cache_dir
+    )
+
+    if use_split_file:
+        train_indices, validation_indices = persisted_train_val_split_indices(
+            train_data, split_file, validation_size
+        )
+        validation_data = select_examples(train_data, validation_indices)
+        train_data = select_examples(train_data, train_indices)
+        features[1] = features[0].select(validation_indices)
+        features[0] = features[0].select(train_indices)
+        # the split file may have been created just now
+        inputs = dict(inputs, split_file=split_file_hash())
+
+    task_examples = multi_task.generate(
+        train_data,
+        test_data,
+        [record["task"] for _, _, record in pending],
+        validation_size=validation_size,
+        validation_data=validation_data,
+        workers=workers,
+        features=features,
+    )
+
+    datasets_hash = None
+    if output_format == "shared":
+        datasets_hash = inputs_hash(
+            [train_file, validation_file, test_file], dataset_format
+        )
+
+    for (task, path, record), probing_task_examples in zip(pending, task_examples):
+        save(
+            task["output_file"],
+            probing_task_examples,
+            output_format,
+            compression,
+            datasets,
+            datasets_hash,
+        )
+        update_manifest(path, dict(record, inputs=inputs))
 
 
 def generate_all_from_tacred(
@@ -67,65 +423,69 @@ def generate_all_from_tacred(
     output_dir: str,
     **kwargs: Dict[str, Any],
 ) -> None:
-    tacred_generate = partial(
-        generate,
-        dataset_format="tacred",
-        train_file=train_file,
-        validation_file=validation_file,
-        test_file=test_file,
-    )
-
-    tacred_generate(
-        probing_task="sentence_length",
-        output_file=join(output_dir, "sentence_length.txt"),
-        buckets=[
-            (5, 15),
-            (16, 23),
-            (24, 27),
-            (28, 31),
-            (32, 35),
-            (36, 39),
-            (40, 43),
-            (44, 47),
-            (48, 55),
-            (55, 70),
-        ],
+    tasks = []
+
+    tasks.append(
+        dict(
+            probing_task="sentence_length",
+            output_file=join(output_dir, "sentence_length.txt"),
+            buckets=[
+                (5, 15),
+                (16, 23),
+                (24, 27),
+                (28, 31),
+                (32, 35),
+                (36, 39),
+                (40, 43),
+                (44, 47),
+                (48, 55),
+                (55, 70),
+            ],
+        )
     )
 
-    tacred_generate(
-        probing_task="entity_distance",
-        output_file=join(output_dir, "entity_distance.txt"),
-        buckets=[
-            (1, 1),
-            (2, 2),
-            (3, 3),
-            (4, 4),
-            (5, 6),
-            (7, 8),
-            (9, 11),
-            (12, 15),
-            (16, 20),
-            (21, 25),
-        ],
+    tasks.append(
+        dict(
+            probing_task="entity_distance",
+            output_file=join(output_dir, "entity_distance.txt"),
+            buckets=[
+                (1, 1),
+                (2, 2),
+                (3, 3),
+                (4, 4),
+                (5, 6),
+                (7, 8),
+                (9, 11),
+                (12, 15),
+                (16, 20),
+                (21, 25),
+            ],
+        )
     )
 
-    tacred_generate(
-        probing_task="argument_order",
-        output_file=join(output_dir, "argument_order.txt"),
+    tasks.append(
+        dict(
+            probing_task="argument_order",
+            output_file=join(output_dir, "argument_order.txt"),
+        )
     )
 
-    tacred_generate(
-        probing_task="entity_exists_between_head_tail",
-        output_file=join(output_dir, "entity_exists_between_head_tail.txt"),
+    tasks.append(
+        dict(
+            probing_task="entity_exists_between_head_tail",
+            output_file=join(output_dir, "entity_exists_between_head_tail.txt"),
+        )
     )
 
     for ner_tag in ["ORGANIZATION", "PERSON", "LOCATION", "MISC", "DATE"]:
-        tacred_generate(
-            probing_task="entity_type_count_between_head_tail",
-            output_file=join(
-                output_dir, f"entity_type_count_{ner_tag}_between_head_tail.txt"
-            ),
-            ner_count_tag=ner_tag,
+        tasks.append(
+            dict(
+                probing_task="entity_type_count_between_head_tail",
+                output_file=join(
+                    output_dir, f"entity_type_count_{ner_tag}_between_head_tail.txt"
+                ),
+                ner_count_tag=ner_tag,
+            )
         )
 
     for argument, position in [
@@ -134,51 +494,72 @@ def generate_all_from_tacred(
         ("tail", "left"),
         ("tail", "right"),
     ]:
-        tacred_generate(
-            probing_task="pos_tag_argument_position",
-            output_file=join(output_dir, f"pos_tag_{argument}_{position}.txt"),
-            argument=argument,
-            position=position,
+        tasks.append(
+            dict(
+                probing_task="pos_tag_argument_position",
+                output_file=join(output_dir, f"pos_tag_{argument}_{position}.txt"),
+                argument=argument,
+                position=position,
+            )
         )
 
     for argument in ["head", "tail"]:
-        tacred_generate(
-            probing_task="argument_type",
-            output_file=join(output_dir, f"argument_type_{argument}.txt"),
-            argument=argument,
+        tasks.append(
+            dict(
+                probing_task="argument_type",
+                output_file=join(output_dir, f"argument_type_{argument}.txt"),
+                argument=argument,
+            )
         )
 
-    tacred_generate(
-        probing_task="tree_depth",
-        output_file=join(output_dir, "tree_depth.txt"),
-        buckets=[
-            (1, 2),
-            (3, 3),
-            (4, 4),
-            (5, 5),
-            (6, 6),
-            (7, 7),
-            (8, 8),
-            (9, 9),
-            (10, 10),
-            (11, 15),
-        ],
+    tasks.append(
+        dict(
+            probing_task="tree_depth",
+            output_file=join(output_dir, "tree_depth.txt"),
+            buckets=[
+                (1, 2),
+                (3, 3),
+                (4, 4),
+                (5, 5),
+                (6, 6),
+                (7, 7),
+                (8, 8),
+                (9, 9),
+                (10, 10),
+                (11, 15),
+            ],
+        )
     )
 
-    tacred_generate(
-        probing_task="sdp_tree_depth",
-        output_file=join(output_dir, "sdp_tree_depth.txt"),
-        buckets=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 10)],
+    tasks.append(
+        dict(
+            probing_task="sdp_tree_depth",
+            output_file=join(output_dir, "sdp_tree_depth.txt"),
+            buckets=[(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 10)],
+        )
     )
 
     for argument in ["head", "tail"]:
-        tacred_generate(
-            probing_task="argument_grammatical_role",
-            output_file=join(output_dir, f"argument_{argument}_grammatical_role.txt"),
-            argument=argument,
-            roles=["nsubj", "dobj", "iobj", "nsubjpass"],
+        tasks.append(
+            dict(
+                probing_task="argument_grammatical_role",
+                output_file=join(
+                    output_dir, f"argument_{argument}_grammatical_role.txt"
+                ),
+                argument=argument,
+                roles=["nsubj", "dobj", "iobj", "nsubjpass"],
+            )
         )
 
+    generate_tasks(
+        train_file,
+        test_file,
+        tasks,
+        validation_file=validation_file,
+        dataset_format="tacred",
+        **kwargs,
+    )
+
 
 def generate_all_from_semeval(
     train_file: str,
@@ -187,29 +568,37 @@ def generate_all_from_semeval(
     output_dir: str,
     **kwargs: Dict[str, Any],
 ) -> None:
-    semeval_generate = partial(
-        generate,
-        dataset_format="tacred",
-        train_file=train_file,
-        validation_file=validation_file,
-        test_file=test_file,
-    )
-
-    semeval_generate(
-        probing_task="sentence_length",
-        output_file=join(output_dir, "sentence_length.txt"),
-        buckets=[(5, 10), (11, 15), (16, 20), (21, 25), (26, 30), (31, 35), (36, 70)],
+    tasks = []
+
+    tasks.append(
+        dict(
+            probing_task="sentence_length",
+            output_file=join(output_dir, "sentence_length.txt"),
+            buckets=[
+                (5, 10),
+                (11, 15),
+                (16, 20),
+                (21, 25),
+                (26, 30),
+                (31, 35),
+                (36, 70),
+            ],
+        )
     )
 
-    semeval_generate(
-        probing_task="entity_distance",
-        output_file=join(output_dir, "entity_distance.txt"),
-        buckets=[(1, 2), (3, 4), (5, 6), (7, 8), (9, 25)],
+    tasks.append(
+        dict(
+            probing_task="entity_distance",
+            output_file=join(output_dir, "entity_distance.txt"),
+            buckets=[(1, 2), (3, 4), (5, 6), (7, 8), (9, 25)],
+        )
     )
 
-    semeval_generate(
-        probing_task="entity_exists_between_head_tail",
-        output_file=join(output_dir, "entity_exists_between_head_tail.txt"),
+    tasks.append(
+        dict(
+            probing_task="entity_exists_between_head_tail",
+            output_file=join(output_dir, "entity_exists_between_head_tail.txt"),
+        )
     )
 
     keep_tags_head_left = ["DT", "JJ", "NN", "IN", "PRP$", "VBN", "NNP"]
@@ -223,12 +612,14 @@ def generate_all_from_semeval(
         ("tail", "left", keep_tags_tail_left),
         ("tail", "right", keep_tags_tail_right),
     ]:
-        semeval_generate(
-            probing_task="pos_tag_argument_position",
-            output_file=join(output_dir, f"pos_tag_{argument}_{position}.txt"),
-            argument=argument,
-            position=position,
-            keep_tags=keep_tags,
+        tasks.append(
+            dict(
+                probing_task="pos_tag_argument_position",
+                output_file=join(output_dir, f"pos_tag_{argument}_{position}.txt"),
+                argument=argument,
+                position=position,
+                keep_tags=keep_tags,
+            )
         )
 
     keep_types_head = [
@@ -257,32 +648,51 @@ def generate_all_from_semeval(
     ]
 
     for argument, keep_types in [("head", keep_types_head), ("tail", keep_types_tail)]:
-        semeval_generate(
-            probing_task="argument_type",
-            output_file=join(output_dir, f"argument_type_{argument}.txt"),
-            argument=argument,
-            keep_types=keep_types,
+        tasks.append(
+            dict(
+                probing_task="argument_type",
+                output_file=join(output_dir, f"argument_type_{argument}.txt"),
+                argument=argument,
+                keep_types=keep_types,
+            )
         )
 
-    semeval_generate(
-        probing_task="tree_depth",
-        output_file=join(output_dir, "tree_depth.txt"),
-        buckets=[(1, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 15)],
+    tasks.append(
+        dict(
+            probing_task="tree_depth",
+            output_file=join(output_dir, "tree_depth.txt"),
+            buckets=[(1, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 15)],
+        )
     )
 
-    semeval_generate(
-        probing_task="sdp_tree_depth",
-        output_file=join(output_dir, "sdp_tree_depth.txt"),
-        buckets=[(1, 1), (2, 2), (3, 3), (4, 10)],
+    tasks.append(
+        dict(
+            probing_task="sdp_tree_depth",
+            output_file=join(output_dir, "sdp_tree_depth.txt"),
+            buckets=[(1, 1), (2, 2), (3, 3), (4, 10)],
+        )
     )
 
     for argument in ["head", "tail"]:
-        semeval_generate(
-            probing_task="argument_grammatical_role",
-            output_file=join(output_dir, f"argument_{argument}_grammatical_role.txt"),
-            argument=argument,
-            roles=["nsubj", "dobj", "iobj", "nsubjpass"],
+        tasks.append(
+            dict(
+                probing_task="argument_grammatical_role",
+                output_file=join(
+                    output_dir, f"argument_{argument}_grammatical_role.txt"
+                ),
+                argument=argument,
+                roles=["nsubj", "dobj", "iobj", "nsubjpass"],
+            )
         )
 
+    generate_tasks(
+        train_file,
+        test_file,
+        tasks,
+        validation_file=validation_file,
+        dataset_format="tacred",
+        **kwargs,
+    )
+
 
 fire.Fire()
@@ -0,0 +1,61 @@
+from typing import List, Tuple, Optional
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_lookup(buckets: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Splits the integer range covered by the (inclusive, possibly overlapping) buckets
+    into elementary intervals [edges[i], edges[i + 1]) and returns the edges together
+    with the index of the first bucket containing each interval, -1 for gaps.
+    """
+    edges = np.unique(
+        [bucket_min for bucket_min, _ in buckets]
+        + [bucket_max + 1 for _, bucket_max in buckets]
+    )
+    interval_buckets = np.full(max(len(edges) - 1, 0), -1, dtype=np.int64)
+    # assign in reverse, so that the first matching bucket wins
+    for idx in reversed(range(len(buckets))):
+        bucket_min, bucket_max = buckets[idx]
+        start, end = np.searchsorted(edges, [bucket_min, bucket_max + 1])
+        interval_buckets[start:end] = idx
+    return edges, interval_buckets
+
+
+def assign_buckets(values: np.ndarray, buckets: List[Tuple[int, int]]) -> np.ndarray:
+    """
+    Returns for each integer value the index of the first bucket (bucket_min,
+    bucket_max) with bucket_min <= value <= bucket_max, or -1 if there is none.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    if not buckets:
+        return np.full(len(values), -1, dtype=np.int64)
+
+    edges, interval_buckets = bucket_lookup(buckets)
+    intervals = np.searchsorted(edges, values, side="right") - 1
+    in_range = (intervals >= 0) & (intervals < len(interval_buckets))
+    return np.where(
+        in_range, interval_buckets[np.clip(intervals, 0, len(edges) - 2)], -1
+    )
+
+
+def bucket_labels(
+    values: np.ndarray, buckets: List[Tuple[int, int]]
+) -> List[Optional[str]]:
+    """
+    Returns the bucket index of each value as a label, None for values outside of
+    all buckets. Logs the number of dropped examples.
+    """
+    indices = assign_buckets(values, buckets)
+
+    num_dropped = int(np.count_nonzero(indices < 0))
+    if num_dropped:
+        logger.info(
+            f"Dropped {num_dropped} of {len(indices)} examples outside of the buckets"
+        )
+
+    labels = np.array([str(idx) for idx in range(len(buckets))] + [None], dtype=object)
+    return labels[indices].tolist()
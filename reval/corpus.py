@@ -0,0 +1,318 @@
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+
+import os
+import json
+import numpy as np
+from array import array
+from reval.vocabulary import Vocabulary
+
+CORPUS_FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+
+# per-token columns, interned to integer ids
+TOKEN_COLUMNS = ["tokens", "ner", "pos", "dep"]
+# per-example columns, interned to integer ids
+EXAMPLE_COLUMNS = ["label", "head_type", "tail_type", "split"]
+# per-example (start, end) argument spans
+SPAN_COLUMNS = ["head", "tail"]
+ALL_COLUMNS = TOKEN_COLUMNS + ["dep_head"] + EXAMPLE_COLUMNS + SPAN_COLUMNS
+# number of examples __iter__() decodes at once
+ITER_BLOCK_SIZE = 1024
+
+
+def select_tokens(
+    offsets: np.ndarray, indices: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the offsets of the examples at indices once they are concatenated, in
+    that order, and the indices of their tokens into the per-token columns.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    starts = offsets[:-1][indices]
+    lengths = (offsets[1:] - offsets[:-1])[indices]
+
+    selected_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=selected_offsets[1:])
+    token_indices = np.arange(selected_offsets[-1]) + np.repeat(
+        starts - selected_offsets[:-1], lengths
+    )
+    return selected_offsets, token_indices
+
+
+class ColumnarCorpus(object):
+    """
+    Array-backed corpus. Per-token annotations of all sentences are stored in flat
+    int32 arrays, with offsets[i]:offsets[i + 1] delimiting sentence i. Tokens and
+    tags are interned to integer ids with one Vocabulary per column.
+
+    Indexing with an int or iterating yields the same example dicts the loaders in
+    reval.datasets produce, so a corpus can be passed wherever a list of examples is
+    expected. Indexing with a slice or a sequence of indices returns a sub-corpus.
+    """
+
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        vocabs: Dict[str, Vocabulary],
+        ids: Optional[List[Optional[str]]] = None,
+    ) -> None:
+        self.offsets = offsets
+        self.columns = columns
+        self.vocabs = vocabs
+        self.ids = ids
+
+    @classmethod
+    def from_examples(
+        cls,
+        examples: Iterable[Dict[str, Any]],
+        vocabs: Optional[Dict[str, Vocabulary]] = None,
+    ) -> "ColumnarCorpus":
+        """
+        Builds a corpus in a single pass over examples. Pass the same vocabs to
+        several corpora (e.g. train, validation and test) to share the integer ids.
+        """
+        vocabs = vocabs if vocabs is not None else {}
+        offsets = array("q", [0])
+        buffers: Dict[str, array] = {}
+        ids: Optional[List[Optional[str]]] = None
+
+        def add_columns(names):
+            for name in names:
+                buffers[name] = array("i")
+                if name in TOKEN_COLUMNS or name in EXAMPLE_COLUMNS:
+                    vocabs.setdefault(name, Vocabulary())
+
+        for example in examples:
+            if len(offsets) == 1:
+                # the first example determines which columns are present
+                add_columns(name for name in ALL_COLUMNS if name in example)
+                if "id" in example:
+                    ids = []
+
+            for name, buffer in buffers.items():
+                value = example[name]
+                if name in TOKEN_COLUMNS:
+                    buffer.extend(vocabs[name].encode(value))
+                elif name in EXAMPLE_COLUMNS:
+                    buffer.append(vocabs[name].add(value))
+                else:
+                    buffer.extend(value)
+
+            offsets.append(offsets[-1] + len(example["tokens"]))
+            if ids is not None:
+                ids.append(example["id"])
+
+        if len(offsets) == 1:
+            # without examples, all columns are present and empty, so that an empty
+            # corpus (e.g. of a task without examples) still loads like any other
+            add_columns(ALL_COLUMNS)
+            ids = []
+
+        columns = {
+            name: (
+                np.frombuffer(buffer, dtype=np.int32)
+                if buffer
+                else np.zeros(0, dtype=np.int32)
+            )
+            for name, buffer in buffers.items()
+        }
+        for name in SPAN_COLUMNS:
+            if name in columns:
+                columns[name] = columns[name].reshape(-1, 2)
+
+        return cls(np.frombuffer(offsets, dtype=np.int64), columns, vocabs, ids)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "ColumnarCorpus":
+        """
+        Loads a corpus written by save(). By default the arrays are memory-mapped
+        rather than read, so loading is independent of the corpus size.
+        """
+        with open(os.path.join(directory, HEADER_FILE), "r") as f:
+            header = json.load(f)
+
+        if header["format_version"] != CORPUS_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported corpus format version {header['format_version']} "
+                + f"in '{directory}'."
+            )
+
+        def load_array(name):
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+
+        columns = {name: load_array(name) for name in header["columns"]}
+        vocabs = {name: Vocabulary(items) for name, items in header["vocabs"].items()}
+        ids = load_array("id").tolist() if header["ids"] else None
+
+        return cls(load_array("offsets"), columns, vocabs, ids)
+
+    def save(self, directory: str, content_hash: Optional[str] = None) -> None:
+        """
+        Writes one .npy file per column and a JSON header holding the vocabularies,
+        and the content_hash of the inputs the corpus was created from, if given.
+        """
+        os.makedirs(directory, exist_ok=True)
+
+        np.save(os.path.join(directory, "offsets.npy"), self.offsets)
+        for name, values in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+        if self.ids is not None:
+            np.save(os.path.join(directory, "id.npy"), np.array(self.ids, dtype=str))
+
+        header = dict(
+            format_version=CORPUS_FORMAT_VERSION,
+            num_examples=len(self),
+            columns=list(self.columns),
+            vocabs={
+                name: vocab.idx2item
+                for name, vocab in self.vocabs.items()
+                if name in self.columns
+            },
+            ids=self.ids is not None,
+        )
+        if content_hash is not None:
+            header["content_hash"] = content_hash
+        # the header is written last, it marks the directory as complete
+        with open(os.path.join(directory, HEADER_FILE), "w") as f:
+            json.dump(header, f)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def column_values(self, name: str) -> List[Any]:
+        """
+        Returns the decoded values of a per-example column, e.g. all labels.
+        """
+        values = self.columns[name]
+        if name in EXAMPLE_COLUMNS:
+            return self.vocabs[name].decode(values.tolist())
+        return [tuple(value) for value in values.tolist()]
+
+    def token_lists(self, name: str) -> List[List[Any]]:
+        """
+        Decodes a per-token column to one list per sentence, in bulk.
+        """
+        values = self.columns[name]
+        if name in TOKEN_COLUMNS:
+            values = np.asarray(self.vocabs[name].idx2item, dtype=object)[values]
+        flat = values.tolist()
+        offsets = self.offsets.tolist()
+        return [flat[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """
+        Decodes the whole corpus to a list of example dicts, column by column.
+        """
+        columns = {}
+        for name in self.columns:
+            if name in TOKEN_COLUMNS or name == "dep_head":
+                columns[name] = self.token_lists(name)
+            else:
+                columns[name] = self.column_values(name)
+        if self.ids is not None:
+            columns["id"] = self.ids
+
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+    def with_vocabs(self, vocabs: Dict[str, Vocabulary]) -> "ColumnarCorpus":
+        """
+        Returns the corpus re-encoded with the given vocabularies, e.g. to share the
+        integer ids of independently loaded splits. Unseen items are added.
+        """
+        columns = dict(self.columns)
+        for name, vocab in self.vocabs.items():
+            if name not in columns:
+                continue
+            shared_vocab = vocabs.setdefault(name, Vocabulary())
+            if shared_vocab is vocab or len(vocab) == 0:
+                continue
+            lookup = np.asarray(shared_vocab.encode(vocab.idx2item), dtype=np.int32)
+            columns[name] = lookup[columns[name]]
+        return ColumnarCorpus(self.offsets, columns, vocabs, self.ids)
+
+    def compacted(self) -> "ColumnarCorpus":
+        """
+        Returns the corpus with each vocabulary reduced to the items it uses,
+        renumbered in order of their first occurrence, i.e. with the ids from_examples()
+        assigns. Used to store a subset of a corpus with large shared vocabularies.
+        """
+        columns = dict(self.columns)
+        vocabs = {}
+        for name, vocab in self.vocabs.items():
+            if name not in columns:
+                continue
+            values, first_index = np.unique(columns[name], return_index=True)
+            used = values[np.argsort(first_index)]
+            lookup = np.full(len(vocab), -1, dtype=np.int32)
+            lookup[used] = np.arange(len(used), dtype=np.int32)
+            columns[name] = lookup[columns[name]]
+            vocabs[name] = Vocabulary(vocab.decode(used.tolist()))
+        return ColumnarCorpus(self.offsets, columns, vocabs, self.ids)
+
+    def select(self, indices: Iterable[int]) -> "ColumnarCorpus":
+        """
+        Returns a new corpus containing the examples at indices, in that order.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        offsets, token_indices = select_tokens(self.offsets, indices)
+
+        columns = {
+            name: (
+                values[token_indices]
+                if name in TOKEN_COLUMNS or name == "dep_head"
+                else values[indices]
+            )
+            for name, values in self.columns.items()
+        }
+        ids = [self.ids[i] for i in indices.tolist()] if self.ids is not None else None
+        return ColumnarCorpus(offsets, columns, self.vocabs, ids)
+
+    def example(self, i: int) -> Dict[str, Any]:
+        start, end = self.offsets[i], self.offsets[i + 1]
+        example: Dict[str, Any] = {}
+        for name, values in self.columns.items():
+            if name in TOKEN_COLUMNS:
+                example[name] = self.vocabs[name].decode(values[start:end].tolist())
+            elif name == "dep_head":
+                example[name] = values[start:end].tolist()
+            elif name in EXAMPLE_COLUMNS:
+                example[name] = self.vocabs[name][values[i]]
+            else:
+                example[name] = tuple(values[i].tolist())
+        if self.ids is not None:
+            example["id"] = self.ids[i]
+        return example
+
+    def __getitem__(
+        self, key: Union[int, slice, Iterable[int]]
+    ) -> Union[Dict[str, Any], "ColumnarCorpus"]:
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("corpus index out of range")
+            return self.example(key)
+        if isinstance(key, slice):
+            return self.select(range(*key.indices(len(self))))
+        return self.select(key)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # decode block-wise, in bulk, but never the whole corpus at once
+        for start in range(0, len(self), ITER_BLOCK_SIZE):
+            yield from self[start : start + ITER_BLOCK_SIZE].to_list()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __repr__(self) -> str:
+        return (
+            f"ColumnarCorpus(examples={len(self)}, tokens={self.offsets[-1]}, "
+            f"columns={list(self.columns)})"
+        )
@@ -0,0 +1,78 @@
+import os
+import shutil
+import hashlib
+import logging
+from functools import lru_cache
+from reval.corpus import ColumnarCorpus, CORPUS_FORMAT_VERSION, HEADER_FILE
+from reval.datasets import load_columnar_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def file_hash(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Returns the SHA-256 hex digest of a file's content. The digest is memoised per
+    file path, size and modification time, so every file is read only once per run
+    unless it changes.
+    """
+    stat = os.stat(file_path)
+    return _file_hash(
+        os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns, chunk_size
+    )
+
+
+@lru_cache(maxsize=None)
+def _file_hash(file_path: str, size: int, mtime_ns: int, chunk_size: int) -> str:
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def cached_dataset_path(file_path: str, dataset_format: str, cache_dir: str) -> str:
+    """
+    Returns the cache entry of a dataset file. The key covers the file content, the
+    loader format and the corpus format version, so any change to one of them
+    results in a different entry.
+    """
+    key = f"{file_hash(file_path)}-{dataset_format}-v{CORPUS_FORMAT_VERSION}"
+    return os.path.join(cache_dir, key)
+
+
+def load_cached_dataset(
+    file_path: str, dataset_format: str, cache_dir: str
+) -> ColumnarCorpus:
+    """
+    Loads a dataset from the parsed-corpus cache, parsing and caching it first if
+    there is no entry for the current content of file_path.
+    """
+    cache_path = cached_dataset_path(file_path, dataset_format, cache_dir)
+
+    if is_cached(cache_path):
+        logger.info(f"Loading {file_path} from cache: {cache_path}")
+        return ColumnarCorpus.load(cache_path)
+
+    return parse_and_cache_dataset(file_path, dataset_format, cache_path)
+
+
+def is_cached(cache_path: str) -> bool:
+    return os.path.exists(os.path.join(cache_path, HEADER_FILE))
+
+
+def parse_and_cache_dataset(
+    file_path: str, dataset_format: str, cache_path: str
+) -> ColumnarCorpus:
+    logger.info(f"Parsing {file_path}, caching it in: {cache_path}")
+    corpus = load_columnar_dataset(file_path, dataset_format)
+
+    # write to a temporary directory first, so that readers never see a partial entry
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    corpus.save(tmp_path)
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # another process stored the same entry in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    return corpus
@@ -6,35 +6,204 @@
 @author: leonhard.hennig@dfki.de
 """
 
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Union, Optional
 
+import os
+import json
+import hashlib
 import logging
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from sklearn.model_selection import train_test_split
+from reval.corpus import ColumnarCorpus
+from reval.datasets import load_columnar_dataset
+from reval.dataset_cache import (
+    cached_dataset_path,
+    is_cached,
+    parse_and_cache_dataset,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
-def train_val_split(train_data: List[Dict[str, Any]],
+def train_val_split(train_data: Union[List[Dict[str, Any]], ColumnarCorpus],
                     validation_size: float = 0.1) -> Tuple[List[Dict[str, Any]],List[Dict[str, Any]]]:
 
+    train_indices, validation_indices = train_val_split_indices(
+        train_data, validation_size
+    )
+    return (
+        select_examples(train_data, train_indices),
+        select_examples(train_data, validation_indices),
+    )
+
+
+def train_val_split_indices(
+    train_data: Union[List[Dict[str, Any]], ColumnarCorpus],
+    validation_size: float = 0.1,
+) -> Tuple[List[int], List[int]]:
+    """
+    Returns the indices of the train and validation examples of a stratified split
+    of train_data, see train_val_split().
+    """
     logger.info("Splitting training data into train and validation dataset.")
 
+    if isinstance(train_data, ColumnarCorpus):
+        all_labels = train_data.column_values("label")
+    else:
+        all_labels = [example["label"] for example in train_data]
+
     # stratified splitting requires a class to be present at least twice
-    counter = Counter([example["label"] for example in train_data])
+    counter = Counter(all_labels)
     labels_to_filter = [
         label for label, count in counter.most_common() if count < 2
     ]
     logger.info(f"Labels to filter: {labels_to_filter}")
 
-    filtered_train_data = [
-        example
-        for example in train_data
-        if example["label"] not in labels_to_filter
+    # split example indices, so that a ColumnarCorpus is never expanded to dicts
+    filtered_indices = [
+        i
+        for i, label in enumerate(all_labels)
+        if label not in labels_to_filter
     ]
-    labels = [example["label"] for example in filtered_train_data]
-    train_data, validation_data = train_test_split(
-        filtered_train_data, test_size=validation_size, stratify=labels
+    labels = [all_labels[i] for i in filtered_indices]
+    return train_test_split(
+        filtered_indices, test_size=validation_size, stratify=labels
+    )
+
+
+def select_examples(
+    data: Union[List[Dict[str, Any]], ColumnarCorpus], indices: List[int]
+) -> Union[List[Dict[str, Any]], ColumnarCorpus]:
+    if isinstance(data, ColumnarCorpus):
+        return data.select(indices)
+    return [data[i] for i in indices]
+
+
+def example_ids(data: Union[List[Dict[str, Any]], ColumnarCorpus]) -> List[Any]:
+    if isinstance(data, ColumnarCorpus):
+        return data.ids if data.ids is not None else [None] * len(data)
+    return [example.get("id") for example in data]
+
+
+def example_ids_hash(ids: List[Any]) -> str:
+    """
+    Returns a hash of the set of example ids, independent of their order.
+    """
+    digest = hashlib.sha256()
+    for example_id in sorted(str(example_id) for example_id in ids):
+        digest.update(example_id.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def persisted_train_val_split(
+    train_data: Union[List[Dict[str, Any]], ColumnarCorpus],
+    split_file: str,
+    validation_size: float = 0.1,
+) -> Tuple[Any, Any]:
+    """
+    Like train_val_split(), but the split is computed only if split_file does not
+    exist yet, and is then stored in it as lists of train and validation example
+    ids. Afterwards the split is read from split_file, so that all tasks and runs
+    use the identical train and validation sets. Requires unique example ids, and
+    raises a ValueError if split_file was created from different training data.
+    """
+    train_indices, validation_indices = persisted_train_val_split_indices(
+        train_data, split_file, validation_size
     )
-    return train_data, validation_data
+    return (
+        select_examples(train_data, train_indices),
+        select_examples(train_data, validation_indices),
+    )
+
+
+def persisted_train_val_split_indices(
+    train_data: Union[List[Dict[str, Any]], ColumnarCorpus],
+    split_file: str,
+    validation_size: float = 0.1,
+) -> Tuple[List[int], List[int]]:
+    """
+    Returns the indices of the train and validation examples of the split stored in
+    split_file, computing and storing it first if needed, see
+    persisted_train_val_split().
+    """
+    ids = example_ids(train_data)
+    id2index = {example_id: i for i, example_id in enumerate(ids)}
+    if None in id2index or len(id2index) != len(ids):
+        raise ValueError("Persisting a split requires unique example ids.")
+
+    ids_hash = example_ids_hash(ids)
+
+    if os.path.exists(split_file):
+        logger.info(f"Loading train and validation split from: {split_file}")
+        with open(split_file, "r") as f:
+            split = json.load(f)
+        # split files written before the ids hash was added are checked by coverage
+        num_split_ids = len(split["train"]) + len(split["validation"])
+        if split.get("ids_hash", ids_hash) != ids_hash or num_split_ids != len(ids):
+            raise ValueError(
+                f"Split '{split_file}' was created from different training data."
+            )
+        try:
+            train_indices = [id2index[example_id] for example_id in split["train"]]
+            validation_indices = [
+                id2index[example_id] for example_id in split["validation"]
+            ]
+        except KeyError as e:
+            raise ValueError(
+                f"Example {e} of split '{split_file}' is not in the training data."
+            )
+        return train_indices, validation_indices
+
+    train_indices, validation_indices = train_val_split_indices(
+        train_data, validation_size
+    )
+
+    logger.info(f"Saving train and validation split to: {split_file}")
+    split = dict(
+        ids_hash=ids_hash,
+        train=[ids[i] for i in train_indices],
+        validation=[ids[i] for i in validation_indices],
+    )
+    tmp_path = f"{split_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(split, f)
+    os.replace(tmp_path, split_file)
+
+    return train_indices, validation_indices
+
+
+def load_datasets_concurrently(
+    file_paths: List[str],
+    dataset_format: str,
+    cache_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[ColumnarCorpus]:
+    """
+    Loads several dataset files (e.g. train, validation and test) in parallel.
+    One thread per file does the I/O bound work (hashing, mapping cached corpora),
+    files that need parsing are handed to a process pool. Parsed files are returned
+    as ColumnarCorpus, which is cheap to transfer between processes.
+    """
+    with ThreadPoolExecutor(len(file_paths)) as threads, ProcessPoolExecutor(
+        max_workers
+    ) as processes:
+
+        def load(file_path):
+            if cache_dir:
+                cache_path = cached_dataset_path(file_path, dataset_format, cache_dir)
+                if is_cached(cache_path):
+                    logger.info(f"Loading {file_path} from cache: {cache_path}")
+                    return ColumnarCorpus.load(cache_path)
+                future = processes.submit(
+                    parse_and_cache_dataset, file_path, dataset_format, cache_path
+                )
+            else:
+                future = processes.submit(
+                    load_columnar_dataset, file_path, dataset_format
+                )
+            return future.result()
+
+        return list(threads.map(load, file_paths))
@@ -1,85 +1,358 @@
-from typing import List, Tuple, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, IO, Optional, Union
 
 import os
+import re
 import json
 import csv
-from reval.probing_task_example import ProbingTaskExample
+import logging
+import numpy as np
+from sys import intern
+from itertools import chain
+from reval.corpus import ColumnarCorpus, HEADER_FILE
+from reval.vocabulary import Vocabulary
+from reval.file_utils import atomic_output, open_file, strip_compression_suffix
+from reval.probing_task_example import ProbingTaskExample, CODED_COLUMNS
 
+logger = logging.getLogger(__name__)
 
-def load_jsonl_dataset(file_path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    dataset = []
+BINARY_DATASET_SUFFIX = ".bin"
+TASK_INDEX_SUFFIX = ".idx"
+SHARED_CORPUS_DIR = "corpus" + BINARY_DATASET_SUFFIX
 
-    with open(file_path, "r") as f:
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DELIMITERS = ",] \t\n\r"
+
+
+def _intern_all(strings: List[str]) -> List[str]:
+    # equal tokens and tags share a single string object across the whole corpus
+    return list(map(intern, strings))
+
+
+def iter_jsonl_dataset(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the examples of a JSONL dataset one at a time, so that
+    consumers (e.g. the probing tasks' generate_task_examples) run in bounded memory.
+    """
+    with open_file(file_path, "r") as f:
         for line in f:
             line = line.strip("\n")
+            if not line:
+                continue
             example = json.loads(line)
 
             tokens = example["tokens"]
             head, tail = example["entities"]
             relation = example["label"]
 
-            dataset.append(dict(tokens=tokens, label=relation, head=head, tail=tail))
-    return dataset
-
-
-def load_tacred_dataset(file_path: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    dataset = []
-
-    with open(file_path, "r") as f:
-        data = json.load(f)
-        for example in data:
-            tokens = example["token"]
-            head = (example["subj_start"], example["subj_end"])
-            tail = (example["obj_start"], example["obj_end"])
-            relation = example["relation"]
-
-            ner = example["stanford_ner"]
-            pos = example["stanford_pos"]
-            dep = example["stanford_deprel"]
-            dep_head = example["stanford_head"]
-            head_type = example["subj_type"]
-            tail_type = example["obj_type"]
-
-            id_ = example["id"]
-
-            dataset.append(
-                dict(
-                    tokens=tokens,
-                    label=relation,
-                    head=head,
-                    tail=tail,
-                    ner=ner,
-                    pos=pos,
-                    dep=dep,
-                    dep_head=dep_head,
-                    head_type=head_type,
-                    tail_type=tail_type,
-                    id=id_,
-                )
+            yield dict(
+                tokens=_intern_all(tokens),
+                label=intern(relation),
+                head=head,
+                tail=tail,
             )
-    return dataset
+
+
+def load_jsonl_dataset(file_path: str) -> List[Dict[str, Any]]:
+    return list(iter_jsonl_dataset(file_path))
+
+
+def _iter_json_array(
+    f: IO[str], chunk_size: int = 1 << 16, max_element_size: int = 1 << 28
+) -> Iterator[Any]:
+    """
+    Incrementally decodes a top-level JSON array read from f, yielding one element
+    at a time. Only the current chunk and the element being decoded are held in memory.
+    While an element is incomplete, the reads grow geometrically, so that long
+    elements are decoded in linear time. Raises a ValueError if no element could be
+    decoded from max_element_size characters, e.g. after a syntax error.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    read_size = chunk_size
+
+    def refill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return
+            refill()
+
+    skip_whitespace()
+    if buffer[pos : pos + 1] != "[":
+        raise ValueError("Expected a JSON array.")
+    pos += 1
+    skip_whitespace()
+    if buffer[pos : pos + 1] == "]":
+        return
+
+    def extend_element():
+        nonlocal read_size
+        if len(buffer) - pos > max_element_size:
+            raise ValueError(
+                f"No JSON array element could be decoded from {max_element_size} "
+                "characters, the input is malformed or the element too large."
+            )
+        read_size *= 2
+        refill()
+
+    while True:
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                extend_element()
+                continue
+            # a number cut off at the chunk boundary may still decode, so only
+            # accept an element once its delimiter has been read as well
+            if not eof and (end == len(buffer) or buffer[end] not in _DELIMITERS):
+                extend_element()
+                continue
+            break
+        pos = end
+        read_size = chunk_size
+        yield element
+
+        skip_whitespace()
+        separator = buffer[pos : pos + 1]
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, got '{separator}'.")
+        skip_whitespace()
+
+
+def iter_tacred_dataset(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields the examples of a TACRED-style JSON array one at a time, without
+    loading the whole document.
+    """
+    with open_file(file_path, "r") as f:
+        for example in _iter_json_array(f):
+            yield dict(
+                tokens=_intern_all(example["token"]),
+                label=intern(example["relation"]),
+                head=(example["subj_start"], example["subj_end"]),
+                tail=(example["obj_start"], example["obj_end"]),
+                ner=_intern_all(example["stanford_ner"]),
+                pos=_intern_all(example["stanford_pos"]),
+                dep=_intern_all(example["stanford_deprel"]),
+                dep_head=example["stanford_head"],
+                head_type=intern(example["subj_type"]),
+                tail_type=intern(example["obj_type"]),
+                id=example["id"],
+            )
+
+
+def load_tacred_dataset(file_path: str) -> List[Dict[str, Any]]:
+    return list(iter_tacred_dataset(file_path))
+
+
+DATASET_ITERATORS = {"jsonl": iter_jsonl_dataset, "tacred": iter_tacred_dataset}
+
+
+def load_columnar_dataset(
+    file_path: str,
+    dataset_format: str = "tacred",
+    vocabs: Optional[Dict[str, Vocabulary]] = None,
+) -> ColumnarCorpus:
+    """
+    Streams a dataset straight into a ColumnarCorpus, without building a list of
+    example dicts first. Pass the same vocabs when loading several splits.
+    """
+    iter_dataset = DATASET_ITERATORS.get(dataset_format)
+
+    if iter_dataset is None:
+        raise ValueError(f"'{dataset_format}' is not a valid dataset format.")
+
+    return ColumnarCorpus.from_examples(iter_dataset(file_path), vocabs)
 
 
 def save_probing_task_dataset(
-    file_path: str, examples: List[ProbingTaskExample]
+    file_path: str, examples: Iterable[ProbingTaskExample]
 ) -> None:
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w") as f:
+    with atomic_output(file_path) as tmp_path, open_file(tmp_path, "w") as f:
         writer = csv.writer(f, delimiter="\t")
         for example in examples:
             writer.writerow(
                 [
                     example.split,
                     example.id if example.id else "None",
-                    example.label,
+                    example.decode("label"),
                     example.head[0],
                     example.head[1],
                     example.tail[0],
                     example.tail[1],
-                    " ".join(example.ner),
-                    " ".join(example.pos),
-                    " ".join(example.dep),
+                    " ".join(example.decode("ner")),
+                    " ".join(example.decode("pos")),
+                    " ".join(example.decode("dep")),
                     " ".join(map(str, example.dep_head)),
-                    " ".join(example.tokens),
+                    " ".join(example.decode("tokens")),
                 ]
             )
+
+
+def binary_dataset_path(file_path: str) -> str:
+    """
+    Returns the directory holding the binary counterpart of a TSV probing task file.
+    """
+    return (
+        os.path.splitext(strip_compression_suffix(file_path))[0] + BINARY_DATASET_SUFFIX
+    )
+
+
+def _coded_task_corpus(examples: Iterable[ProbingTaskExample]) -> ColumnarCorpus:
+    # concatenates the ids of examples taken from a corpus, rather than interning
+    # their strings again
+    columns: Dict[str, List[Any]] = {name: [] for name in CODED_COLUMNS}
+    columns.update(dep_head=[], label=[], split=[], head=[], tail=[])
+    lengths, ids = [], []
+    vocabs = label_vocab = None
+    split_vocab = Vocabulary()
+
+    for example in examples:
+        if vocabs is None:
+            vocabs, label_vocab = example.vocabs, example.label_vocab
+        elif example.vocabs is not vocabs or example.label_vocab is not label_vocab:
+            raise ValueError("The task examples must share their vocabularies.")
+        for name in CODED_COLUMNS + ["dep_head", "label", "head", "tail"]:
+            columns[name].append(getattr(example, name))
+        columns["split"].append(split_vocab.add(example.split))
+        lengths.append(len(example.tokens))
+        ids.append(example.id if example.id else "None")
+
+    if label_vocab is None:
+        label_vocab = Vocabulary()
+        columns["label"] = label_vocab.encode(map(str, columns["label"]))
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    arrays = {
+        name: np.concatenate(values).astype(np.int32)
+        for name, values in columns.items()
+        if name in CODED_COLUMNS or name == "dep_head"
+    }
+    arrays.update(
+        (name, np.array(columns[name], dtype=np.int32)) for name in ["label", "split"]
+    )
+    arrays.update(
+        (name, np.array(columns[name], dtype=np.int32).reshape(-1, 2))
+        for name in ["head", "tail"]
+    )
+    task_vocabs = {name: vocabs[name] for name in CODED_COLUMNS}
+    task_vocabs.update(label=label_vocab, split=split_vocab)
+    return ColumnarCorpus(offsets, arrays, task_vocabs, ids).compacted()
+
+
+def save_probing_task_dataset_binary(
+    dir_path: str, examples: Iterable[ProbingTaskExample]
+) -> None:
+    """
+    Writes probing task examples as a ColumnarCorpus directory (one .npy array per
+    column plus a JSON header), which can be memory-mapped instead of parsed.
+    Examples carrying the integer ids of a corpus are stored without decoding them.
+    """
+
+    def example_dicts(examples):
+        for example in examples:
+            yield dict(
+                tokens=example.decode("tokens"),
+                label=str(example.decode("label")),
+                split=example.split,
+                head=example.head,
+                tail=example.tail,
+                ner=example.decode("ner"),
+                pos=example.decode("pos"),
+                dep=example.decode("dep"),
+                dep_head=example.dep_head,
+                id=example.id if example.id else "None",
+            )
+
+    examples = iter(examples)
+    first = next(examples, None)
+    examples = chain([first], examples) if first is not None else iter([])
+    if first is not None and first.vocabs is not None:
+        corpus = _coded_task_corpus(examples)
+    else:
+        corpus = ColumnarCorpus.from_examples(example_dicts(examples))
+
+    with atomic_output(dir_path) as tmp_path:
+        corpus.save(tmp_path)
+
+
+def task_index_path(file_path: str) -> str:
+    """
+    Returns the index file of a probing task stored in the shared corpus layout.
+    """
+    return os.path.splitext(strip_compression_suffix(file_path))[0] + TASK_INDEX_SUFFIX
+
+
+def shared_corpus_path(file_path: str) -> str:
+    """
+    Returns the shared corpus directory next to a probing task file.
+    """
+    return os.path.join(os.path.dirname(file_path), SHARED_CORPUS_DIR)
+
+
+def save_shared_corpus(
+    dir_path: str,
+    datasets: List[Union[List[Dict[str, Any]], ColumnarCorpus]],
+    content_hash: str,
+) -> Dict[str, int]:
+    """
+    Writes the annotated examples of all datasets once, as a ColumnarCorpus shared
+    by the probing tasks in the same directory, and returns the mapping from example
+    id to corpus index. content_hash identifies the content of the inputs the
+    datasets were loaded from; an existing corpus created from the same inputs is
+    reused.
+    """
+    ids = []
+    for data in datasets:
+        if isinstance(data, ColumnarCorpus):
+            ids.extend(data.ids if data.ids is not None else [None] * len(data))
+        else:
+            ids.extend(example.get("id") for example in data)
+
+    id2index = {id_: i for i, id_ in enumerate(ids)}
+    if None in id2index or len(id2index) != len(ids):
+        raise ValueError("The shared corpus layout requires unique example ids.")
+
+    header_path = os.path.join(dir_path, HEADER_FILE)
+    stored_hash = None
+    if os.path.exists(header_path):
+        with open(header_path, "r") as f:
+            stored_hash = json.load(f).get("content_hash")
+
+    if stored_hash == content_hash:
+        logger.info(f"Reusing shared corpus: {dir_path}")
+    else:
+        logger.info(f"Writing shared corpus: {dir_path}")
+        corpus = ColumnarCorpus.from_examples(chain.from_iterable(datasets))
+        with atomic_output(dir_path) as tmp_path:
+            corpus.save(tmp_path, content_hash)
+
+    return id2index
+
+
+def save_probing_task_index(
+    file_path: str, examples: Iterable[ProbingTaskExample], id2index: Dict[str, int]
+) -> None:
+    """
+    Writes the split, shared corpus index and label of each probing task example.
+    """
+    with atomic_output(file_path) as tmp_path, open_file(tmp_path, "w") as f:
+        writer = csv.writer(f, delimiter="\t")
+        for example in examples:
+            writer.writerow(
+                [example.split, id2index[example.id], example.decode("label")]
+            )
@@ -0,0 +1,483 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def heads_to_parents(dep_heads: Sequence[int]) -> np.ndarray:
+    """
+    Converts 1-based dependency heads (0 for a root) to 0-based parent indices, -1
+    for a root.
+    """
+    return np.asarray(dep_heads, dtype=np.int64) - 1
+
+
+def node_depths(parents: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns for each node its distance from the root of its tree and the index of
+    that root. Computed by pointer jumping: in each round, every node adds the
+    distance to the node its pointer refers to and takes over that node's pointer,
+    so that all nodes reach their root within ceil(log2(n)) rounds. Nodes on or
+    below a cycle reach no root and get -1 for both.
+    """
+    num_nodes = len(parents)
+    is_root = parents < 0
+    pointers = np.where(is_root, np.arange(num_nodes), parents)
+    depths = (~is_root).astype(np.int64)
+
+    for _ in range(num_nodes.bit_length()):
+        if is_root[pointers].all():
+            break
+        depths += depths[pointers]
+        pointers = pointers[pointers]
+
+    unreachable = ~is_root[pointers]
+    depths[unreachable] = -1
+    pointers[unreachable] = -1
+    return depths, pointers
+
+
+def subtree_sizes(parents: np.ndarray, depths: np.ndarray) -> np.ndarray:
+    """
+    Returns the number of nodes in the subtree of each node, itself included, given
+    the depths returned by node_depths(). Unreachable nodes get 0.
+    """
+    sizes = (depths >= 0).astype(np.int64)
+    # add the sizes of the subtrees one level at a time, from the deepest level up
+    for depth in range(depths.max(initial=0), 0, -1):
+        nodes = np.flatnonzero(depths == depth)
+        np.add.at(sizes, parents[nodes], sizes[nodes])
+    return sizes
+
+
+def subtree_heights(parents: np.ndarray, depths: np.ndarray) -> np.ndarray:
+    """
+    Returns the height of the subtree of each node, i.e. the length of the longest
+    path down to a leaf, given the depths returned by node_depths(). Same as
+    Tree.depth() for each node. Unreachable nodes get -1.
+    """
+    heights = np.where(depths >= 0, 0, -1)
+    for depth in range(depths.max(initial=0), 0, -1):
+        nodes = np.flatnonzero(depths == depth)
+        np.maximum.at(heights, parents[nodes], heights[nodes] + 1)
+    return heights
+
+
+def ancestor_table(parents: np.ndarray, depths: np.ndarray) -> np.ndarray:
+    """
+    Returns the parent chains of all nodes, given the depths returned by
+    node_depths(): row i holds node i, its parent, grandparent and so on up to its
+    root, padded with -1. Rows of unreachable nodes hold only the node itself.
+    """
+    num_nodes = len(parents)
+    table = np.full((num_nodes, depths.max(initial=0) + 1), -1, dtype=np.int64)
+    table[:, 0] = np.arange(num_nodes)
+    for k in range(1, table.shape[1]):
+        has_ancestor = depths >= k
+        table[has_ancestor, k] = parents[table[has_ancestor, k - 1]]
+    return table
+
+
+def tree_height(dep_heads: Sequence[int]) -> int:
+    """
+    Returns the height of the dependency tree of a sentence, same as Tree.depth() of
+    the tree returned by dep_heads_to_tree(), i.e. of the tree of the last root.
+    """
+    parents = heads_to_parents(dep_heads)
+    roots = np.flatnonzero(parents < 0)
+    if len(roots) == 0:
+        raise ValueError("The dependency heads contain no root.")
+
+    depths, root_indices = node_depths(parents)
+    return int(depths[root_indices == roots[-1]].max())
+
+
+def packed_parents(
+    dep_heads: np.ndarray, offsets: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the parents of all tokens of a packed corpus as indices into the whole
+    corpus, -1 for a root, and the index of the sentence of each token. dep_heads
+    holds the 1-based heads of all tokens of all sentences back to back, offsets the
+    start of each sentence in it followed by len(dep_heads).
+    """
+    dep_heads = np.asarray(dep_heads, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    if (lengths <= 0).any():
+        raise ValueError("The packed corpus contains an empty sentence.")
+
+    sentences = np.repeat(np.arange(len(lengths)), lengths)
+    if ((dep_heads < 0) | (dep_heads > lengths[sentences])).any():
+        raise ValueError("The dependency heads point outside of their sentence.")
+
+    parents = np.where(dep_heads > 0, offsets[:-1][sentences] + dep_heads - 1, -1)
+    return parents, sentences
+
+
+def packed_tree_heights(dep_heads: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Returns the height of the dependency tree of each sentence of a packed corpus
+    (see packed_parents()), same as tree_height() for each sentence, but computed
+    for all of them at once: the depths of all nodes are computed by a single
+    node_depths() call over the whole corpus.
+    """
+    if len(offsets) <= 1:
+        return np.zeros(0, dtype=np.int64)
+
+    parents, sentences = packed_parents(dep_heads, offsets)
+    starts = np.asarray(offsets[:-1], dtype=np.int64)
+    depths, root_indices = node_depths(parents)
+
+    last_roots = np.maximum.reduceat(
+        np.where(parents < 0, np.arange(len(parents)), -1), starts
+    )
+    if (last_roots < 0).any():
+        raise ValueError("The dependency heads of a sentence contain no root.")
+
+    in_last_tree = root_indices == last_roots[sentences]
+    return np.maximum.reduceat(np.where(in_last_tree, depths, 0), starts)
+
+
+# the distance to the shortest dependency path of nodes that are not below it
+PATH_DISTANCE_INFINITY = 10000
+
+
+def lifting_table(parents: np.ndarray, depths: np.ndarray) -> np.ndarray:
+    """
+    Returns the binary lifting table of a forest, given the depths returned by
+    node_depths(): row k holds the 2^k-th ancestor of each node, or the root of its
+    tree if it has none. Enough rows are computed to lift any node to its root.
+    """
+    num_nodes = len(parents)
+    table = np.empty(
+        (max(int(depths.max(initial=0)).bit_length(), 1), num_nodes), dtype=np.int64
+    )
+    table[0] = np.where(parents < 0, np.arange(num_nodes), parents)
+    for k in range(1, len(table)):
+        table[k] = table[k - 1][table[k - 1]]
+    return table
+
+
+def lowest_common_ancestors(
+    table: np.ndarray, depths: np.ndarray, u: np.ndarray, v: np.ndarray
+) -> np.ndarray:
+    """
+    Returns the lowest common ancestor of each pair of nodes u[i] and v[i], or -1 if
+    they are in different trees, given a lifting_table() and the node depths. Takes
+    O(log(depth)) vectorised steps for all pairs at once.
+    """
+    u = np.asarray(u, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    # lift the deeper node of each pair to the depth of the other one
+    deeper = np.where(depths[u] >= depths[v], u, v)
+    other = np.where(depths[u] >= depths[v], v, u)
+    depth_difference = depths[deeper] - depths[other]
+    for k in range(len(table)):
+        deeper = np.where((depth_difference >> k) & 1, table[k][deeper], deeper)
+
+    # lift both nodes to just below their lowest common ancestor
+    for k in reversed(range(len(table))):
+        differ = table[k][deeper] != table[k][other]
+        deeper = np.where(differ, table[k][deeper], deeper)
+        other = np.where(differ, table[k][other], other)
+
+    return np.where(
+        deeper == other,
+        deeper,
+        np.where(table[0][deeper] == table[0][other], table[0][deeper], -1),
+    )
+
+
+def path_distances(parents: np.ndarray, path_mask: np.ndarray) -> np.ndarray:
+    """
+    Returns for each node the number of steps up the tree to the nearest node on the
+    path given by path_mask, PATH_DISTANCE_INFINITY if there is none.
+    """
+    # with the path nodes turned into roots, the distance to the path is the depth
+    depths, root_indices = node_depths(np.where(path_mask, -1, parents))
+    below_path = root_indices >= 0
+    below_path[below_path] = path_mask[root_indices[below_path]]
+    return np.where(below_path, depths, PATH_DISTANCE_INFINITY)
+
+
+class DependencyPaths(object):
+    """
+    Lowest common ancestor and shortest dependency path (SDP) queries on the
+    dependency tree of a sentence. The parents, depths and binary lifting table of
+    all nodes are computed once, each query then takes O(log(depth)) vectorised
+    steps rather than a walk over ancestor lists.
+    """
+
+    def __init__(self, dep_heads: Sequence[int]) -> None:
+        self.parents = heads_to_parents(dep_heads)
+        self.depths, self.root_indices = node_depths(self.parents)
+        self.table = lifting_table(self.parents, self.depths)
+
+    def lca(self, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+        """
+        Returns the lowest common ancestor of each pair of nodes u[i] and v[i], -1 if
+        they are in different trees.
+        """
+        return lowest_common_ancestors(self.table, self.depths, u, v)
+
+    def span_lca(self, nodes: Sequence[int]) -> int:
+        """
+        Returns the lowest common ancestor of all nodes, e.g. the tokens of the head
+        and tail of a relation.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if len(nodes) == 0 or (self.depths[nodes] < 0).any():
+            raise ValueError("The nodes must be non-empty and reach a root.")
+
+        # pairwise reduction, halving the number of nodes in each step
+        while len(nodes) > 1:
+            odd = nodes[-1:] if len(nodes) % 2 else nodes[:0]
+            nodes = np.concatenate([self.lca(nodes[0:-1:2], nodes[1::2]), odd])
+            if (nodes < 0).any():
+                raise ValueError("The nodes are not in the same tree.")
+        return int(nodes[0])
+
+    def path_nodes(
+        self, head: Tuple[int, int], tail: Tuple[int, int]
+    ) -> Tuple[int, np.ndarray]:
+        """
+        Returns the lowest common ancestor of the (inclusive) head and tail spans,
+        and the mask of the nodes on the SDP between them: the ancestors of the span
+        tokens below the lowest common ancestor, and the lowest common ancestor.
+        """
+        tokens = np.concatenate(
+            [np.arange(head[0], head[1] + 1), np.arange(tail[0], tail[1] + 1)]
+        )
+        lca = self.span_lca(tokens)
+
+        path_mask = np.zeros(len(self.parents), dtype=bool)
+        path_mask[lca] = True
+        # walk up from all span tokens at once, until they reach the lca
+        steps = self.depths[tokens] - self.depths[lca]
+        nodes = tokens
+        while len(nodes):
+            nodes, steps = nodes[steps > 0], steps[steps > 0]
+            path_mask[nodes] = True
+            nodes, steps = self.parents[nodes], steps - 1
+        return lca, path_mask
+
+    def pruned_height(
+        self, head: Tuple[int, int], tail: Tuple[int, int], prune: int = 0
+    ) -> int:
+        """
+        Returns the height of the tree pruned to the nodes within prune steps of the
+        SDP between head and tail, same as Tree.depth() of the tree returned by
+        dep_heads_to_tree() for prune >= 0.
+        """
+        lca, path_mask = self.path_nodes(head, tail)
+        included = path_distances(self.parents, path_mask) <= prune
+        return int(self.depths[included].max() - self.depths[lca])
+
+
+def span_tokens(spans: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the tokens of (inclusive) spans, and the index of the span of each.
+    """
+    widths = spans[:, 1] - spans[:, 0] + 1
+    owners = np.repeat(np.arange(len(spans)), widths)
+    first_tokens = np.repeat(np.cumsum(widths) - widths, widths)
+    return spans[owners, 0] + np.arange(widths.sum()) - first_tokens, owners
+
+
+def packed_path_nodes(
+    parents: np.ndarray,
+    depths: np.ndarray,
+    offsets: np.ndarray,
+    heads: np.ndarray,
+    tails: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns for each sentence of a packed corpus, given its parents (see
+    packed_parents()) and their depths, the lowest common ancestor of the head and
+    tail spans, and the mask of the nodes on the SDPs between them, same as
+    DependencyPaths.path_nodes() for each sentence, but computed for all of them at
+    once. heads and tails hold one (inclusive) span per sentence, relative to the
+    start of the sentence; the returned nodes are indices into the packed corpus.
+    """
+    starts = np.asarray(offsets[:-1], dtype=np.int64)
+    lengths = np.diff(offsets)
+    num_sentences = len(starts)
+    table = lifting_table(parents, depths)
+
+    spans = np.concatenate(
+        [np.asarray(heads).reshape(-1, 2), np.asarray(tails).reshape(-1, 2)]
+    ).astype(np.int64)
+    invalid = (spans[:, 0] < 0) | (spans[:, 1] < spans[:, 0])
+    invalid |= spans[:, 1] >= np.concatenate([lengths, lengths])
+    if invalid.any():
+        raise ValueError("The argument spans point outside of their sentence.")
+    spans += np.concatenate([starts, starts])[:, None]
+    tokens, owners = span_tokens(spans)
+    sentences = owners % num_sentences
+    if (depths[tokens] < 0).any():
+        raise ValueError("The argument tokens must reach a root.")
+
+    # fold the tokens of the head and then the tail span of each sentence into their
+    # lowest common ancestor, one token position at a time
+    lcas = spans[:num_sentences, 0].copy()
+    for argument_spans in [spans[:num_sentences], spans[num_sentences:]]:
+        widths = argument_spans[:, 1] - argument_spans[:, 0]
+        for k in range(int(widths.max()) + 1):
+            has_token = widths >= k
+            lcas[has_token] = lowest_common_ancestors(
+                table, depths, lcas[has_token], argument_spans[has_token, 0] + k
+            )
+            if (lcas < 0).any():
+                raise ValueError("The argument tokens are not in the same tree.")
+
+    # walk up from all span tokens at once, until they reach the lca
+    path_mask = np.zeros(len(parents), dtype=bool)
+    path_mask[lcas] = True
+    steps = depths[tokens] - depths[lcas[sentences]]
+    nodes = tokens
+    while len(nodes):
+        nodes, steps = nodes[steps > 0], steps[steps > 0]
+        path_mask[nodes] = True
+        nodes, steps = parents[nodes], steps - 1
+    return lcas, path_mask
+
+
+def packed_pruned_trees(
+    dep_heads: np.ndarray,
+    offsets: np.ndarray,
+    heads: np.ndarray,
+    tails: np.ndarray,
+    prune: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns for each sentence of a packed corpus (see packed_parents()) the tree
+    pruned to the nodes within prune steps of the SDP between the head and tail
+    spans: its root (the lowest common ancestor of the spans) as an index into the
+    packed corpus, the mask of its nodes over all tokens, and its height. heads and
+    tails hold one (inclusive) span per sentence, relative to the start of the
+    sentence.
+    """
+    if len(offsets) <= 1:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros(len(dep_heads), dtype=bool), empty
+
+    parents, _ = packed_parents(dep_heads, offsets)
+    depths, _ = node_depths(parents)
+    lcas, path_mask = packed_path_nodes(parents, depths, offsets, heads, tails)
+
+    included = path_distances(parents, path_mask) <= prune
+    starts = np.asarray(offsets[:-1], dtype=np.int64)
+    heights = np.maximum.reduceat(np.where(included, depths, -1), starts)
+    return lcas, included, heights - depths[lcas]
+
+
+def packed_pruned_tree_heights(
+    dep_heads: np.ndarray,
+    offsets: np.ndarray,
+    heads: np.ndarray,
+    tails: np.ndarray,
+    prune: int = 0,
+) -> np.ndarray:
+    """
+    Returns for each sentence of a packed corpus (see packed_parents()) the height of
+    its tree pruned to the nodes within prune steps of the SDP between the head and
+    tail spans, same as DependencyPaths.pruned_height() for each sentence, but
+    computed for all of them at once. heads and tails hold one (inclusive) span per
+    sentence, relative to the start of the sentence.
+    """
+    return packed_pruned_trees(dep_heads, offsets, heads, tails, prune)[2]
+
+
+def packed_tree_nodes(
+    dep_heads: np.ndarray,
+    offsets: np.ndarray,
+    heads: Optional[np.ndarray] = None,
+    tails: Optional[np.ndarray] = None,
+    prune: int = -1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the parents of all tokens of a packed corpus (see packed_parents()), the
+    mask of the nodes of the tree of each sentence and the root of each tree, all as
+    indices into the packed corpus. The trees are those returned by
+    dep_heads_to_tree(): the tree of the last root of a sentence, or with prune >= 0
+    the tree pruned to the nodes within prune steps of the SDP between the head and
+    tail spans, rooted at their lowest common ancestor.
+    """
+    parents, sentences = packed_parents(dep_heads, offsets)
+    depths, root_indices = node_depths(parents)
+
+    if prune < 0:
+        starts = np.asarray(offsets[:-1], dtype=np.int64)
+        roots = np.maximum.reduceat(
+            np.where(parents < 0, np.arange(len(parents)), -1), starts
+        )
+        if (roots < 0).any():
+            raise ValueError("The dependency heads of a sentence contain no root.")
+        return parents, root_indices == roots[sentences], roots
+
+    if heads is None or tails is None:
+        raise ValueError("Pruning a tree requires the head and tail spans.")
+    roots, path_mask = packed_path_nodes(parents, depths, offsets, heads, tails)
+    return parents, path_distances(parents, path_mask) <= prune, roots
+
+
+def packed_adjacency(
+    dep_heads: np.ndarray,
+    offsets: np.ndarray,
+    directed: bool = True,
+    add_self_loop: bool = False,
+    heads: Optional[np.ndarray] = None,
+    tails: Optional[np.ndarray] = None,
+    prune: int = -1,
+) -> np.ndarray:
+    """
+    Returns the edges of the dependency trees of all sentences of a packed corpus as
+    a (2, num_edges) COO matrix of (source, target) indices into the packed corpus,
+    i.e. the block diagonal adjacency matrix of the batch. Same edges as
+    tree_to_adjacency_list() of each tree returned by dep_heads_to_tree() (see
+    packed_tree_nodes()), shifted by the start of its sentence, but ordered by
+    source and then target rather than breadth-first.
+    """
+    if len(offsets) <= 1:
+        return np.zeros((2, 0), dtype=np.int64)
+
+    parents, included, roots = packed_tree_nodes(
+        dep_heads, offsets, heads, tails, prune
+    )
+    is_child = included.copy()
+    is_child[roots] = False
+    children = np.flatnonzero(is_child)
+
+    edges = [np.stack([parents[children], children])]
+    if not directed:
+        edges.append(edges[0][::-1])
+    if add_self_loop:
+        nodes = np.flatnonzero(included)
+        edges.append(np.stack([nodes, nodes]))
+
+    edges = np.concatenate(edges, axis=1)
+    # a single integer sort key is cheaper than a lexsort of both rows
+    return edges[:, np.argsort(edges[0] * len(parents) + edges[1])]
+
+
+def packed_adjacency_csr(
+    dep_heads: np.ndarray,
+    offsets: np.ndarray,
+    directed: bool = True,
+    add_self_loop: bool = False,
+    heads: Optional[np.ndarray] = None,
+    tails: Optional[np.ndarray] = None,
+    prune: int = -1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the edges of packed_adjacency() in compressed sparse row form: the
+    targets of the edges of node i are indices[indptr[i]:indptr[i + 1]], both as
+    indices into the packed corpus.
+    """
+    edges = packed_adjacency(
+        dep_heads, offsets, directed, add_self_loop, heads, tails, prune
+    )
+    num_nodes = int(offsets[-1]) if len(offsets) else 0
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[0], minlength=num_nodes), out=indptr[1:])
+    return indptr, edges[1]
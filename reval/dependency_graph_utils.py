@@ -5,7 +5,7 @@
 @date: 19.02.19
 @author: leonhard.hennig@dfki.de
 """
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Any
 
 import logging
 from collections import deque
@@ -18,8 +18,24 @@ class Tree(object):
     Reused tree object from stanfordnlp/treelstm.
     Code taken from
     https://github.com/qipeng/gcn-over-pruned-trees/blob/master/model/tree.py
+    Nodes have fixed slots instead of a per-instance __dict__, to keep the trees of
+    large corpora small.
     """
 
+    __slots__ = (
+        "parent",
+        "num_children",
+        "children",
+        "head",
+        "dep_label",
+        "token",
+        "idx",
+        "dist",
+        "_size",
+        "_depth",
+        "_repr",
+    )
+
     def __init__(self):
         self.parent = None
         self.num_children = 0
@@ -29,6 +45,9 @@ class Tree(object):
         self.token = None
         self.idx = None
         self.dist = None
+        self._size = None
+        self._depth = None
+        self._repr = None
 
     def add_child(self, child):
         child.parent = self
@@ -36,7 +55,7 @@ class Tree(object):
         self.children.append(child)
 
     def size(self):
-        if hasattr(self, "_size"):
+        if self._size is not None:
             return self._size
         count = 1
         for i in range(self.num_children):
@@ -47,17 +66,11 @@ class Tree(object):
     def is_root(self):
         return self.head == 0
 
-    def parent(self):
-        return self.parent
-
     def parent_idx(self):
         return self.head
 
-    def dep_label(self):
-        return self.dep_label
-
     def depth(self):
-        if hasattr(self, "_depth"):
+        if self._depth is not None:
             return self._depth
         count = 0
         if self.num_children > 0:
@@ -76,10 +89,9 @@ class Tree(object):
                 yield x
 
     def __repr__(self):
-        if hasattr(self, "_repr"):
-            return self._repr
-        else:
+        if self._repr is None:
             self._repr = f'{self.token}-{self.idx}[{self.dep_label}->{self.head}]'
+        return self._repr
 
 
 def dep_heads_to_tree(
@@ -208,7 +220,9 @@ def tree_to_adjacency_list(
     tree: Tree, directed: bool = True, add_self_loop: bool = False
 ) -> List[Tuple[int, int]]:
     """
-    Convert a tree object to an adjacency list.
+    Convert a tree object to an adjacency list. See
+    reval.dependency_arrays.packed_adjacency() for the edges of a whole batch of
+    sentences as arrays, computed directly from their dependency heads.
     """
     adjacency_list = []
 
@@ -234,4 +248,31 @@ def tree_to_adjacency_list(
         for i in idx:
             adjacency_list.append((i, i))
 
-    return adjacency_list
\ No newline at end of file
+    return adjacency_list
+
+
+def find_common_head(
+    start: int, end: int, example: Dict[str, Any]
+) -> Tuple[int, int, int]:
+    """
+    Tests if all nodes in [start,end] (inclusive) have a common ancestor that is part of [start,end], and returns
+    the index of that node.
+    :param start:
+    :param end:
+    :param tree:
+    :return:
+    """
+    heads = [
+        (i, example["dep_head"][i]) for i in range(start, end + 1)
+    ]  # heads are 1-based!
+    outside_head = set()
+    for head in heads:
+        if head[1] - 1 not in range(start, end + 1):  # heads are 1-based!
+            outside_head.add(head[1])
+    if len(outside_head) != 1:
+        return (-1, -1, -1)
+    last_child = None
+    for head in heads:
+        if head[1] == list(outside_head)[0]:
+            last_child = head
+    return last_child[0], last_child[1], example["dep"][last_child[0]]
@@ -25,6 +25,8 @@ class RE(object):
         params.batch_size = 128 if "batch_size" not in params else params.batch_size
         params.nhid = 0 if "nhid" not in params else params.nhid
         params.kfold = 5 if "kfold" not in params else params.kfold
+        # annotation columns consumed by the batcher (default: all)
+        params.columns = None if "columns" not in params else params.columns
 
         if "classifier" not in params or not params["classifier"]:
             params.classifier = {"nhid": 0}
@@ -72,69 +74,65 @@ class RE(object):
         tpath = self.params.task_path
         assert name in self.list_tasks, str(name) + " not in " + str(self.list_tasks)
 
+        task_kwargs = dict(seed=self.params.seed, columns=self.params.columns)
+
         # Probing Tasks
         if name == "Length":
-            self.evaluation = LengthEval(tpath, seed=self.params.seed)
+            self.evaluation = LengthEval(tpath, **task_kwargs)
         elif name == "EntityDistance":
-            self.evaluation = EntityDistanceEval(tpath, seed=self.params.seed)
+            self.evaluation = EntityDistanceEval(tpath, **task_kwargs)
         elif name == "ArgumentOrder":
-            self.evaluation = ArgumentOrderEval(tpath, seed=self.params.seed)
+            self.evaluation = ArgumentOrderEval(tpath, **task_kwargs)
         elif name == "EntityExistsBetweenHeadTail":
-            self.evaluation = EntityExistsBetweenHeadTailEval(
-                tpath, seed=self.params.seed
-            )
+            self.evaluation = EntityExistsBetweenHeadTailEval(tpath, **task_kwargs)
         elif name == "EntityCountORGBetweenHeadTail":
             self.evaluation = EntityTypeCountBetweenHeadTailEval(
-                tpath, "ORGANIZATION", seed=self.params.seed
+                tpath, "ORGANIZATION", **task_kwargs
             )
         elif name == "EntityCountPERBetweenHeadTail":
             self.evaluation = EntityTypeCountBetweenHeadTailEval(
-                tpath, "PERSON", seed=self.params.seed
+                tpath, "PERSON", **task_kwargs
             )
         elif name == "EntityCountLOCBetweenHeadTail":
             self.evaluation = EntityTypeCountBetweenHeadTailEval(
-                tpath, "LOCATION", seed=self.params.seed
+                tpath, "LOCATION", **task_kwargs
             )
         elif name == "EntityCountMISCBetweenHeadTail":
             self.evaluation = EntityTypeCountBetweenHeadTailEval(
-                tpath, "MISC", seed=self.params.seed
+                tpath, "MISC", **task_kwargs
             )
         elif name == "EntityCountDATEBetweenHeadTail":
             self.evaluation = EntityTypeCountBetweenHeadTailEval(
-                tpath, "DATE", seed=self.params.seed
+                tpath, "DATE", **task_kwargs
             )
         elif name == "PosTagHeadLeft":
             self.evaluation = PosTagArgPositionEval(
-                tpath, "head", "left", seed=self.params.seed
+                tpath, "head", "left", **task_kwargs
             )
         elif name == "PosTagHeadRight":
             self.evaluation = PosTagArgPositionEval(
-                tpath, "head", "right", seed=self.params.seed
+                tpath, "head", "right", **task_kwargs
             )
         elif name == "PosTagTailLeft":
             self.evaluation = PosTagArgPositionEval(
-                tpath, "tail", "left", seed=self.params.seed
+                tpath, "tail", "left", **task_kwargs
             )
         elif name == "PosTagTailRight":
             self.evaluation = PosTagArgPositionEval(
-                tpath, "tail", "right", seed=self.params.seed
+                tpath, "tail", "right", **task_kwargs
             )
         elif name == "ArgTypeHead":
-            self.evaluation = ArgumentTypeEval(tpath, "head", seed=self.params.seed)
+            self.evaluation = ArgumentTypeEval(tpath, "head", **task_kwargs)
         elif name == "ArgTypeTail":
-            self.evaluation = ArgumentTypeEval(tpath, "tail", seed=self.params.seed)
+            self.evaluation = ArgumentTypeEval(tpath, "tail", **task_kwargs)
         elif name == "TreeDepth":
-            self.evaluation = TreeDepthEval(tpath, seed=self.params.seed)
+            self.evaluation = TreeDepthEval(tpath, **task_kwargs)
         elif name == "SDPTreeDepth":
-            self.evaluation = SDPTreeDepthEval(tpath, seed=self.params.seed)
+            self.evaluation = SDPTreeDepthEval(tpath, **task_kwargs)
         elif name == "ArgumentHeadGrammaticalRole":
-            self.evaluation = ArgumentGrammaticalRoleEval(
-                tpath, "head", seed=self.params.seed
-            )
+            self.evaluation = ArgumentGrammaticalRoleEval(tpath, "head", **task_kwargs)
         elif name == "ArgumentTailGrammaticalRole":
-            self.evaluation = ArgumentGrammaticalRoleEval(
-                tpath, "tail", seed=self.params.seed
-            )
+            self.evaluation = ArgumentGrammaticalRoleEval(tpath, "tail", **task_kwargs)
         else:
             raise ValueError(f"'{name}' is not a valid task.")
 
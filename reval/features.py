@@ -0,0 +1,448 @@
+from typing import List, Dict, Any, Optional, Iterable, Callable, Tuple
+
+import os
+import json
+import logging
+import numpy as np
+from functools import partial
+from itertools import chain
+from reval.corpus import ColumnarCorpus, select_tokens
+from reval.dataset_cache import file_hash
+from reval.dependency_arrays import packed_tree_heights, packed_pruned_trees
+from reval.dependency_graph_utils import find_common_head
+from reval.parallel import chunked_map
+from reval.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+# bump whenever the computation of a feature changes, to invalidate cached tables
+FEATURES_FORMAT_VERSION = 2
+
+
+def example_common_head(example: Dict[str, Any], argument: str) -> Tuple[int, int]:
+    """
+    Returns the index and (1-based) dependency head of the argument's common head,
+    see find_common_head(), or (-1, -1) if the argument tokens do not form a subtree
+    with a single head.
+    """
+    arg_start, arg_end = example[argument]
+    idx, head, _ = find_common_head(arg_start, arg_end, example)
+    return idx, head
+
+
+def compute_n_tokens(data: Iterable[Dict[str, Any]], workers: int = 1) -> np.ndarray:
+    if isinstance(data, ColumnarCorpus):
+        return data.lengths.astype(np.int32)
+    return np.fromiter((len(example["tokens"]) for example in data), dtype=np.int32)
+
+
+def argument_spans(data: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    if isinstance(data, ColumnarCorpus):
+        heads, tails = data.columns["head"], data.columns["tail"]
+    else:
+        heads = np.array([example["head"] for example in data], dtype=np.int32)
+        tails = np.array([example["tail"] for example in data], dtype=np.int32)
+    return heads.reshape(-1, 2), tails.reshape(-1, 2)
+
+
+def compute_entity_distance(
+    data: Iterable[Dict[str, Any]], workers: int = 1
+) -> np.ndarray:
+    heads, tails = argument_spans(data)
+    head_start, head_end = heads[:, 0], heads[:, 1]
+    tail_start, tail_end = tails[:, 0], tails[:, 1]
+    return np.where(
+        tail_start > head_end, tail_start - head_end, head_start - tail_end
+    ).astype(np.int32)
+
+
+def compute_argument_order(
+    data: Iterable[Dict[str, Any]], workers: int = 1
+) -> np.ndarray:
+    heads, tails = argument_spans(data)
+    return (tails[:, 0] < heads[:, 0]).astype(np.int8)
+
+
+def example_offsets(data: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """
+    Returns the offsets of the examples of data into its packed per-token columns.
+    """
+    if isinstance(data, ColumnarCorpus):
+        return data.offsets
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum([len(example["tokens"]) for example in data], out=offsets[1:])
+    return offsets
+
+
+def packed_dep_heads(data: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the dependency heads of all tokens of data as one flat array, and the
+    offsets of the examples into it.
+    """
+    if isinstance(data, ColumnarCorpus):
+        return data.columns["dep_head"], data.offsets
+    dep_heads = np.fromiter(
+        chain.from_iterable(example["dep_head"] for example in data), dtype=np.int64
+    )
+    return dep_heads, example_offsets(data)
+
+
+def compute_tree_depth(data: Iterable[Dict[str, Any]], workers: int = 1) -> np.ndarray:
+    # all sentences at once, see reval.dependency_arrays
+    dep_heads, offsets = packed_dep_heads(data)
+    return packed_tree_heights(dep_heads, offsets).astype(np.int32)
+
+
+def compute_sdp_trees(data: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    Returns the trees of all examples pruned to the SDP between head and tail: their
+    height, their root (the token index of the lowest common ancestor of head and
+    tail) and the per-token mask of their nodes.
+    """
+    dep_heads, offsets = packed_dep_heads(data)
+    heads, tails = argument_spans(data)
+    roots, nodes, heights = packed_pruned_trees(dep_heads, offsets, heads, tails)
+    return {
+        "sdp_tree_depth": heights.astype(np.int32),
+        "sdp_root": (roots - offsets[:-1]).astype(np.int32),
+        "sdp_nodes": nodes,
+    }
+
+
+def compute_common_heads(
+    data: Iterable[Dict[str, Any]], workers: int = 1, argument: str = "head"
+) -> np.ndarray:
+    values = compute_example_values(
+        partial(example_common_head, argument=argument), data, workers
+    )
+    return np.array(values, dtype=np.int32).reshape(-1, 2)
+
+
+def common_head_relations(
+    data: Iterable[Dict[str, Any]], common_heads: np.ndarray
+) -> List[Optional[str]]:
+    """
+    Returns the dependency relation of the common head of each example, given their
+    compute_common_heads(), None where there is none.
+    """
+    indices = common_heads[:, 0]
+    if isinstance(data, ColumnarCorpus):
+        relations = [None] * len(indices)
+        defined = np.flatnonzero(indices >= 0)
+        dep_ids = data.columns["dep"][data.offsets[:-1][defined] + indices[defined]]
+        for i, relation in zip(
+            defined.tolist(), data.vocabs["dep"].decode(dep_ids.tolist())
+        ):
+            relations[i] = relation
+        return relations
+    return [
+        example["dep"][idx] if idx >= 0 else None
+        for example, idx in zip(data, indices.tolist())
+    ]
+
+
+def first_occurrence_order(ids: np.ndarray) -> np.ndarray:
+    """
+    Returns the distinct values of ids in order of their first occurrence.
+    """
+    values, first_index = np.unique(ids, return_index=True)
+    return values[np.argsort(first_index)]
+
+
+def pos_tag_inventory(
+    data: Iterable[Dict[str, Any]], indices: Optional[Iterable[int]] = None
+) -> List[str]:
+    """
+    Returns the distinct POS tags of the examples of data, or of the examples at
+    indices, in order of their first occurrence.
+    """
+    if isinstance(data, ColumnarCorpus):
+        pos = data.columns["pos"]
+        if indices is not None:
+            pos = pos[select_tokens(data.offsets, indices)[1]]
+        return data.vocabs["pos"].decode(first_occurrence_order(pos).tolist())
+
+    examples = data if indices is None else (data[i] for i in indices)
+    return list(dict.fromkeys(chain.from_iterable(ex["pos"] for ex in examples)))
+
+
+def pos_tag_ids(
+    data: Iterable[Dict[str, Any]],
+) -> Tuple[np.ndarray, np.ndarray, Vocabulary]:
+    """
+    Returns the POS tags of all tokens of data as one flat array of ids, the offsets
+    of the examples into it, and the Vocabulary of the ids, which holds the POS tags
+    of data in order of their first occurrence.
+    """
+    if isinstance(data, ColumnarCorpus):
+        # renumber the ids of the corpus vocabulary, which may be shared by other
+        # splits, by their first occurrence in data
+        corpus_ids = data.columns["pos"]
+        tag_ids = first_occurrence_order(corpus_ids)
+        lookup = np.full(len(data.vocabs["pos"]), -1, dtype=np.int32)
+        lookup[tag_ids] = np.arange(len(tag_ids), dtype=np.int32)
+        vocab = Vocabulary(data.vocabs["pos"].decode(tag_ids.tolist()))
+        return lookup[corpus_ids], data.offsets, vocab
+
+    vocab = Vocabulary()
+    ids = np.array(
+        vocab.encode(chain.from_iterable(example["pos"] for example in data)),
+        dtype=np.int32,
+    )
+    return ids, example_offsets(data), vocab
+
+
+def compute_neighbour_pos(
+    data: Iterable[Dict[str, Any]],
+) -> Tuple[Dict[str, np.ndarray], Vocabulary]:
+    """
+    Returns the ids of the POS tags to the left and right of the head and tail of
+    all examples, -1 where the argument is at the start or end of the sentence, and
+    the Vocabulary of all POS tags of data they refer to.
+    """
+    ids, offsets, vocab = pos_tag_ids(data)
+    starts, lengths = offsets[:-1], np.diff(offsets)
+    heads, tails = argument_spans(data)
+
+    columns = {}
+    for argument, spans in [("head", heads), ("tail", tails)]:
+        # the end index of an argument is inclusive
+        for position, neighbours in [
+            ("left", spans[:, 0] - 1),
+            ("right", spans[:, 1] + 1),
+        ]:
+            defined = (neighbours >= 0) & (neighbours < lengths)
+            tags = ids.take(starts + neighbours, mode="clip")
+            columns[f"{argument}_{position}_pos"] = np.where(defined, tags, -1).astype(
+                np.int32
+            )
+    return columns, vocab
+
+
+def compute_example_values(
+    example_fn: Callable[[Dict[str, Any]], Optional[str]],
+    data: Iterable[Dict[str, Any]],
+    workers: int = 1,
+) -> List[Optional[str]]:
+    return chunked_map(example_fn, data, workers)
+
+
+# numeric features, stored as int arrays
+NUMERIC_FEATURES = {
+    "n_tokens": compute_n_tokens,
+    "entity_distance": compute_entity_distance,
+    "argument_order": compute_argument_order,
+    "tree_depth": compute_tree_depth,
+}
+
+# the trees pruned to the SDP between head and tail, computed for all three at once:
+# the tree height, the token index of the root and the per-token mask of the nodes
+SDP_FEATURES = ["sdp_tree_depth", "sdp_root", "sdp_nodes"]
+
+# the (index, 1-based dependency head) of the common head of an argument's tokens,
+# one int32 row per example, (-1, -1) for None
+COMMON_HEAD_FEATURES = {"head_common_head": "head", "tail_common_head": "tail"}
+
+# the grammatical roles, i.e. the dependency relations of the common heads, stored
+# as int32 ids into a Vocabulary, -1 for None
+CATEGORICAL_FEATURES = {
+    "head_role": "head_common_head",
+    "tail_role": "tail_common_head",
+}
+
+# the POS tags next to the arguments, computed for all four at once and stored as
+# int32 ids into a Vocabulary of all POS tags of the data, -1 for None
+NEIGHBOUR_POS_FEATURES = [
+    "head_left_pos",
+    "head_right_pos",
+    "tail_left_pos",
+    "tail_right_pos",
+]
+
+# features stored as Vocabulary ids
+VOCABULARY_FEATURES = list(CATEGORICAL_FEATURES) + NEIGHBOUR_POS_FEATURES
+
+# features with one value per token rather than per example
+TOKEN_FEATURES = ["sdp_nodes"]
+
+FEATURES = (
+    list(NUMERIC_FEATURES)
+    + SDP_FEATURES
+    + list(COMMON_HEAD_FEATURES)
+    + VOCABULARY_FEATURES
+)
+
+
+class FeatureTable(object):
+    """
+    Per-example features of a dataset (token count, argument distance and order,
+    tree depth, the SDP tree, the common heads of the arguments and their
+    grammatical roles, and neighbouring POS tags), one typed array per feature with
+    one row per example, or one value per token for the TOKEN_FEATURES (see
+    token_offsets()). A feature is computed from the data when
+    first accessed and, given a cache_path, stored there, so that later tables of the
+    same data never touch the examples for it again.
+
+    A table returned by select() holds a subset of the rows of its parent, e.g. of a
+    train/validation split, and takes its features from the parent.
+    """
+
+    def __init__(
+        self,
+        data: Optional[Iterable[Dict[str, Any]]] = None,
+        cache_path: Optional[str] = None,
+        workers: int = 1,
+    ) -> None:
+        self.data = data
+        self.cache_path = cache_path
+        self.workers = workers
+        self.columns: Dict[str, np.ndarray] = {}
+        self.vocabs: Dict[str, Vocabulary] = {}
+        self.parent: Optional["FeatureTable"] = None
+        self.indices: Optional[np.ndarray] = None
+        self._pos_tags: Optional[List[str]] = None
+
+    def select(self, indices: Iterable[int]) -> "FeatureTable":
+        """
+        Returns a table of the rows at indices, in that order.
+        """
+        table = FeatureTable()
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.parent is not None:
+            table.parent, table.indices = self.parent, self.indices[indices]
+        else:
+            table.parent, table.indices = self, indices
+        return table
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """
+        Returns the values of a numeric feature, or the Vocabulary ids (-1 for None)
+        of a categorical feature.
+        """
+        if name not in self.columns:
+            if self.parent is not None:
+                if name in TOKEN_FEATURES:
+                    token_indices = select_tokens(
+                        self.parent.token_offsets(), self.indices
+                    )[1]
+                    self.columns[name] = self.parent[name][token_indices]
+                else:
+                    self.columns[name] = self.parent[name][self.indices]
+                if name in VOCABULARY_FEATURES:
+                    self.vocabs[name] = self.parent.vocabs[name]
+            elif not self.load_column(name):
+                for computed_name in self.compute_column(name):
+                    self.save_column(computed_name)
+        return self.columns[name]
+
+    def decode(self, name: str) -> List[Optional[str]]:
+        """
+        Returns the values of a categorical feature, None where undefined.
+        """
+        ids = self[name]
+        items = np.array(self.vocabs[name].idx2item + [None], dtype=object)
+        return items[ids].tolist()
+
+    def token_offsets(self) -> np.ndarray:
+        """
+        Returns the offsets of the examples into the TOKEN_FEATURES columns, e.g. the
+        SDP nodes of example i are self["sdp_nodes"][offsets[i]:offsets[i + 1]].
+        """
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(self["n_tokens"], out=offsets[1:])
+        return offsets
+
+    def pos_tags(self) -> List[str]:
+        """
+        Returns the distinct POS tags of the examples, in order of their first
+        occurrence.
+        """
+        if self._pos_tags is None:
+            if self.parent is not None:
+                self._pos_tags = pos_tag_inventory(self.parent.data, self.indices)
+            else:
+                # the vocabulary of the neighbour POS columns holds all POS tags in
+                # order of their first occurrence
+                self["head_left_pos"]
+                self._pos_tags = self.vocabs["head_left_pos"].idx2item
+        return self._pos_tags
+
+    def compute_column(self, name: str) -> List[str]:
+        """
+        Computes a feature and returns the names of all columns computed with it.
+        """
+        if name in NUMERIC_FEATURES:
+            self.columns[name] = NUMERIC_FEATURES[name](self.data, self.workers)
+        elif name in SDP_FEATURES:
+            columns = compute_sdp_trees(self.data)
+            self.columns.update(columns)
+            return list(columns)
+        elif name in COMMON_HEAD_FEATURES:
+            self.columns[name] = compute_common_heads(
+                self.data, self.workers, COMMON_HEAD_FEATURES[name]
+            )
+        elif name in NEIGHBOUR_POS_FEATURES:
+            columns, vocab = compute_neighbour_pos(self.data)
+            self.columns.update(columns)
+            self.vocabs.update((column_name, vocab) for column_name in columns)
+            return list(columns)
+        elif name in CATEGORICAL_FEATURES:
+            vocab = Vocabulary()
+            # derived from the (possibly cached) common heads of the argument
+            values = common_head_relations(self.data, self[CATEGORICAL_FEATURES[name]])
+            self.columns[name] = np.array(
+                [vocab.add(value) if value is not None else -1 for value in values],
+                dtype=np.int32,
+            )
+            self.vocabs[name] = vocab
+        else:
+            raise ValueError(f"'{name}' is not a valid feature.")
+        return [name]
+
+    def load_column(self, name: str) -> bool:
+        if self.cache_path is None:
+            return False
+        file_path = os.path.join(self.cache_path, f"{name}.npy")
+        if not os.path.exists(file_path):
+            return False
+
+        self.columns[name] = np.load(file_path)
+        if name in VOCABULARY_FEATURES:
+            with open(os.path.join(self.cache_path, f"{name}.json"), "r") as f:
+                self.vocabs[name] = Vocabulary(json.load(f))
+        return True
+
+    def save_column(self, name: str) -> None:
+        if self.cache_path is None:
+            return
+        os.makedirs(self.cache_path, exist_ok=True)
+        tmp_suffix = f".{os.getpid()}.tmp"
+
+        # the vocabulary is written first, the .npy file marks the column as complete
+        if name in VOCABULARY_FEATURES:
+            vocab_path = os.path.join(self.cache_path, f"{name}.json")
+            with open(vocab_path + tmp_suffix, "w") as f:
+                json.dump(self.vocabs[name].idx2item, f)
+            os.replace(vocab_path + tmp_suffix, vocab_path)
+
+        file_path = os.path.join(self.cache_path, f"{name}.npy")
+        with open(file_path + tmp_suffix, "wb") as f:
+            np.save(f, self.columns[name])
+        os.replace(file_path + tmp_suffix, file_path)
+
+    def __len__(self) -> int:
+        if self.indices is not None:
+            return len(self.indices)
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        return f"FeatureTable(examples={len(self)}, columns={list(self.columns)})"
+
+
+def cached_features_path(file_path: str, dataset_format: str, cache_dir: str) -> str:
+    """
+    Returns the feature cache entry of a dataset file, keyed like the parsed-corpus
+    cache by the file content and loader format, plus the features format version.
+    """
+    key = f"{file_hash(file_path)}-{dataset_format}-features-v{FEATURES_FORMAT_VERSION}"
+    return os.path.join(cache_dir, key)
@@ -0,0 +1,98 @@
+from typing import IO, Iterator, Optional
+
+import os
+import bz2
+import gzip
+import lzma
+import shutil
+from contextlib import contextmanager
+
+COMPRESSION_SUFFIXES = [".gz", ".bz2", ".xz", ".zst"]
+
+
+def compression_suffix(file_path: str) -> Optional[str]:
+    """
+    Returns the compression suffix of file_path, or None for uncompressed files.
+    """
+    for suffix in COMPRESSION_SUFFIXES:
+        if file_path.endswith(suffix):
+            return suffix
+    return None
+
+
+def strip_compression_suffix(file_path: str) -> str:
+    suffix = compression_suffix(file_path)
+    return file_path[: -len(suffix)] if suffix else file_path
+
+
+def find_file(file_path: str) -> str:
+    """
+    Returns file_path if it exists, else the first existing compressed variant of
+    it (e.g. file_path + ".gz"). Falls back to file_path.
+    """
+    if os.path.exists(file_path):
+        return file_path
+    for suffix in COMPRESSION_SUFFIXES:
+        if os.path.exists(file_path + suffix):
+            return file_path + suffix
+    return file_path
+
+
+def open_file(file_path: str, mode: str = "r", encoding: Optional[str] = None) -> IO:
+    """
+    Opens a plain or a gzip, bzip2, xz or zstd compressed file, detected from the
+    file extension. Data is (de)compressed while streaming, never as a whole.
+    """
+    suffix = compression_suffix(file_path)
+
+    if suffix is None:
+        return open(file_path, mode, encoding=encoding)
+
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+
+    if suffix == ".gz":
+        return gzip.open(file_path, mode, encoding=encoding)
+    if suffix == ".bz2":
+        return bz2.open(file_path, mode, encoding=encoding)
+    if suffix == ".xz":
+        return lzma.open(file_path, mode, encoding=encoding)
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            f"Reading or writing '{file_path}' requires the 'zstandard' package."
+        )
+    return zstandard.open(file_path, mode, encoding=encoding)
+
+
+def remove_path(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+@contextmanager
+def atomic_output(path: str) -> Iterator[str]:
+    """
+    Yields a temporary path next to path, to write a file or directory to, which
+    replaces path once the block completes. If the block raises, path is left as it
+    was and the temporary output is removed, so that a failed run never leaves a
+    truncated output behind.
+    """
+    dir_name, base_name = os.path.split(os.path.abspath(path))
+    os.makedirs(dir_name, exist_ok=True)
+    # keeps the suffix of path, open_file() detects the compression from it
+    tmp_path = os.path.join(dir_name, f".{os.getpid()}.tmp.{base_name}")
+    old_path = os.path.join(dir_name, f".{os.getpid()}.old.{base_name}")
+    try:
+        yield tmp_path
+        if os.path.isdir(path):
+            # a directory cannot be renamed onto another one, move the old one aside
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+    finally:
+        remove_path(tmp_path)
+        remove_path(old_path)
@@ -0,0 +1,73 @@
+from typing import Dict, Any
+
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """
+    Returns a SHA-256 digest of the reval package sources, so that outputs created
+    by a different version of the generation code are regenerated.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sha = hashlib.sha256()
+    for dir_path, dir_names, file_names in os.walk(package_dir):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".py"):
+                continue
+            file_path = os.path.join(dir_path, file_name)
+            sha.update(os.path.relpath(file_path, package_dir).encode("utf-8"))
+            with open(file_path, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()
+
+
+def manifest_path(output_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), MANIFEST_FILE)
+
+
+def load_manifest(file_path: str) -> Dict[str, Any]:
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def normalize_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    # e.g. bucket tuples become lists, as they would be after a round trip to disk
+    return json.loads(json.dumps(record, sort_keys=True))
+
+
+def is_up_to_date(output_path: str, record: Dict[str, Any]) -> bool:
+    """
+    Returns True if output_path exists and was created from the inputs, parameters
+    and code version described by record, according to the manifest next to it.
+    """
+    if not os.path.exists(output_path):
+        return False
+    manifest = load_manifest(manifest_path(output_path))
+    return manifest.get(os.path.basename(output_path)) == normalize_record(record)
+
+
+def update_manifest(output_path: str, record: Dict[str, Any]) -> None:
+    """
+    Records that output_path was created from the inputs, parameters and code
+    version described by record.
+    """
+    file_path = manifest_path(output_path)
+    manifest = load_manifest(file_path)
+    manifest[os.path.basename(output_path)] = normalize_record(record)
+
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, file_path)
@@ -0,0 +1,60 @@
+from typing import List, Any, Callable, Sequence, Optional, Tuple
+
+import multiprocessing
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# the function and items of the running chunked_map(), inherited by forked workers
+_worker_state: Optional[Tuple[Callable[[Any], Any], Sequence[Any]]] = None
+
+
+def _init_worker(func: Callable[[Any], Any], items: Sequence[Any]) -> None:
+    global _worker_state
+    _worker_state = (func, items)
+
+
+def _map_chunk(chunk: Tuple[int, int]) -> List[Any]:
+    func, items = _worker_state
+    start, end = chunk
+    return [func(item) for item in items[start:end]]
+
+
+def chunked_map(
+    func: Callable[[Any], Any],
+    items: Sequence[Any],
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> List[Any]:
+    """
+    Returns [func(item) for item in items], computed in a pool of worker processes.
+    Workers are handed index ranges of chunk_size items rather than the items
+    themselves: where fork is available they share items with this process
+    copy-on-write, otherwise each worker receives a single copy of them on start-up.
+    Results are returned in the order of items, regardless of the number of workers.
+    """
+    if workers <= 1 or len(items) <= chunk_size:
+        return [func(item) for item in items]
+
+    global _worker_state
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        _worker_state = (func, items)
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("fork")
+        )
+    else:
+        executor = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(func, items)
+        )
+
+    chunks = [
+        (start, min(start + chunk_size, len(items)))
+        for start in range(0, len(items), chunk_size)
+    ]
+    try:
+        with executor:
+            return list(chain.from_iterable(executor.map(_map_chunk, chunks)))
+    finally:
+        _worker_state = None
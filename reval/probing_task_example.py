@@ -1,7 +1,21 @@
-from typing import List, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Union
+
+from reval.corpus import ColumnarCorpus
+from reval.vocabulary import Vocabulary
+
+# the columns an example may carry as integer ids into its vocabs
+CODED_COLUMNS = ["tokens", "ner", "pos", "dep"]
 
 
 class ProbingTaskExample:
+    """
+    A labeled example of a probing task. Examples taken from a ColumnarCorpus (see
+    from_corpus()) carry the tokens and the ner, pos and dep tags as integer ids into
+    the corpus vocabularies, which are shared by all splits, instead of strings. Once
+    the task's examples are streamed, their label is an id into the label_vocab of the
+    task as well. decode() returns the strings, e.g. for writing a TSV file.
+    """
+
     def __init__(
         self,
         tokens: List[str],
@@ -12,8 +26,10 @@ class ProbingTaskExample:
         ner: List[str],
         pos: List[str],
         dep: List[str],
-        dep_head: List[str],
+        dep_head: List[int],
         id: Optional[str] = None,
+        vocabs: Optional[Dict[str, Vocabulary]] = None,
+        label_vocab: Optional[Vocabulary] = None,
     ) -> None:
         self.tokens = tokens
         self.label = label
@@ -25,3 +41,67 @@ class ProbingTaskExample:
         self.dep = dep
         self.dep_head = dep_head
         self.id = id
+        self.vocabs = vocabs
+        self.label_vocab = label_vocab
+
+    @classmethod
+    def from_example(
+        cls, example: Dict[str, Any], label: str, split: str
+    ) -> "ProbingTaskExample":
+        return cls(
+            tokens=example["tokens"],
+            label=label,
+            split=split,
+            head=example["head"],
+            tail=example["tail"],
+            ner=example["ner"],
+            pos=example["pos"],
+            dep=example["dep"],
+            dep_head=example["dep_head"],
+            id=example["id"],
+        )
+
+    @classmethod
+    def from_corpus(
+        cls, corpus: ColumnarCorpus, index: int, label: str, split: str
+    ) -> "ProbingTaskExample":
+        """
+        Returns the example at index of corpus, without decoding its columns.
+        """
+        start, end = corpus.offsets[index], corpus.offsets[index + 1]
+        columns = corpus.columns
+        return cls(
+            tokens=columns["tokens"][start:end],
+            label=label,
+            split=split,
+            head=tuple(columns["head"][index].tolist()),
+            tail=tuple(columns["tail"][index].tolist()),
+            ner=columns["ner"][start:end],
+            pos=columns["pos"][start:end],
+            dep=columns["dep"][start:end],
+            dep_head=columns["dep_head"][start:end],
+            id=corpus.ids[index] if corpus.ids is not None else None,
+            vocabs=corpus.vocabs,
+        )
+
+    def encode_label(self, label_vocab: Vocabulary) -> None:
+        """
+        Replaces the label with its id into label_vocab, adding it if unseen.
+        """
+        self.label = label_vocab.add(self.label)
+        self.label_vocab = label_vocab
+
+    def decode(self, name: str) -> Union[List[str], str]:
+        """
+        Returns the label, the tokens or a tag column as strings.
+        """
+        if name == "label":
+            if self.label_vocab is None:
+                return self.label
+            return self.label_vocab[self.label]
+        if name not in CODED_COLUMNS:
+            raise ValueError(f"'{name}' is not a coded column.")
+        values = getattr(self, name)
+        if self.vocabs is None:
+            return values
+        return self.vocabs[name].decode(values.tolist())
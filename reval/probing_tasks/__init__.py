@@ -1,8 +1,13 @@
+from typing import List, Dict, Any, Sequence, Tuple
+
 import os
-import io
 import logging
 import numpy as np
+from functools import lru_cache
 from senteval.tools.validation import SplitClassifier
+from reval.corpus import ColumnarCorpus, HEADER_FILE, ITER_BLOCK_SIZE
+from reval.file_utils import open_file, find_file
+from reval.datasets import binary_dataset_path, task_index_path, shared_corpus_path
 from reval.probing_tasks import (
     sent_length,
     entity_distance,
@@ -16,6 +21,10 @@ from reval.probing_tasks import (
     argument_grammatical_role,
 )
 
+# probing tasks whose generate() takes the FeatureTable objects of the train,
+# validation and test data, and the number of worker processes to compute them with
+FEATURE_TABLE_TASKS = {"tree_depth", "sdp_tree_depth", "argument_grammatical_role"}
+
 
 def get_probing_task_generator(name: str):
     task_generator = {
@@ -37,10 +46,105 @@ def get_probing_task_generator(name: str):
     return task_generator
 
 
+def get_probing_task_labeler(name: str):
+    """
+    Returns the create_labeler function of a probing task. Called with the train,
+    validation and test data and the task's arguments, it returns a function that
+    maps an example to its label, or to None if the task discards it.
+    """
+    task_labeler = {
+        "sentence_length": sent_length.create_labeler,
+        "entity_distance": entity_distance.create_labeler,
+        "argument_order": argument_order.create_labeler,
+        "entity_exists_between_head_tail": entity_exists_between_head_tail.create_labeler,
+        "entity_type_count_between_head_tail": entity_type_count_between_head_tail.create_labeler,
+        "pos_tag_argument_position": pos_tag_argument_position.create_labeler,
+        "argument_type": argument_type.create_labeler,
+        "tree_depth": tree_depth.create_labeler,
+        "sdp_tree_depth": sdp_tree_depth.create_labeler,
+        "argument_grammatical_role": argument_grammatical_role.create_labeler,
+    }.get(name)
+
+    if task_labeler is None:
+        raise ValueError(f"'{name}' is not a valid probing task.")
+
+    return task_labeler
+
+
+def get_probing_task_batch_labeler(name: str):
+    """
+    Returns the create_batch_labeler function of a probing task, or None if the task
+    has none. Called with the FeatureTable objects of the train, validation and test
+    data and the task's arguments, it returns a function that maps all examples of a
+    dataset to their labels at once, given the dataset's FeatureTable.
+    """
+    return {
+        "sentence_length": sent_length.create_batch_labeler,
+        "entity_distance": entity_distance.create_batch_labeler,
+        "argument_order": argument_order.create_batch_labeler,
+        "pos_tag_argument_position": pos_tag_argument_position.create_batch_labeler,
+        "tree_depth": tree_depth.create_batch_labeler,
+        "sdp_tree_depth": sdp_tree_depth.create_batch_labeler,
+        "argument_grammatical_role": argument_grammatical_role.create_batch_labeler,
+    }.get(name)
+
+
+# annotation columns a batcher may opt out of via params.columns
+ANNOTATION_COLUMNS = ["ner", "pos", "dep", "dep_head"]
+
+
+def _decode_corpus(
+    corpus: ColumnarCorpus, columns: Sequence[str] = ANNOTATION_COLUMNS
+) -> Dict[str, List[Any]]:
+    decoded = {
+        "X": corpus.token_lists("tokens"),
+        "id": corpus.ids,
+        "head": corpus.column_values("head"),
+        "tail": corpus.column_values("tail"),
+    }
+    for name in columns:
+        decoded[name] = corpus.token_lists(name)
+    return decoded
+
+
+@lru_cache(maxsize=1)
+def _load_shared_corpus(fpath: str, mtime: float) -> ColumnarCorpus:
+    # memory-mapped once and reused by all tasks resolved against the same corpus
+    return ColumnarCorpus.load(fpath, mmap_mode="r")
+
+
+class CorpusTokenLists(object):
+    """
+    The token lists of the examples at indices of a corpus, decoded on access (in
+    blocks when iterated) instead of all at once.
+    """
+
+    def __init__(self, corpus: ColumnarCorpus, indices: np.ndarray) -> None:
+        self.corpus = corpus
+        self.indices = indices
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.corpus.select(self.indices[key]).token_lists("tokens")
+        return self.corpus.select([self.indices[key]]).token_lists("tokens")[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), ITER_BLOCK_SIZE):
+            yield from self[start : start + ITER_BLOCK_SIZE]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
 class REPROBINGEval(object):
-    def __init__(self, task, task_path, seed=1111):
+    def __init__(self, task, task_path, seed=1111, columns=None):
         self.seed = seed
         self.task = task
+        # annotation columns to load, the others are passed to the batcher as None
+        self.columns = ANNOTATION_COLUMNS if columns is None else list(columns)
+        for column in self.columns:
+            if column not in ANNOTATION_COLUMNS:
+                raise ValueError(f"'{column}' is not a valid annotation column.")
         logging.debug(
             "***** (Probing) Transfer task : %s classification *****", self.task.upper()
         )
@@ -91,47 +195,222 @@ class REPROBINGEval(object):
         )
 
     def do_prepare(self, params, prepare):
-        samples = (
-            self.task_data["train"]["X"]
-            + self.task_data["dev"]["X"]
-            + self.task_data["test"]["X"]
-        )
+        if "corpus" in self.task_data["train"]:
+            # binary and shared tasks decode the sentences only while they are read
+            samples = CorpusTokenLists(
+                self.task_data["train"]["corpus"],
+                np.concatenate(
+                    [split_data["indices"] for split_data in self.task_data.values()]
+                ),
+            )
+        else:
+            samples = (
+                self.task_data["train"]["X"]
+                + self.task_data["dev"]["X"]
+                + self.task_data["test"]["X"]
+            )
         return prepare(params, samples)
 
     def loadFile(self, fpath):
         self.tok2split = {"tr": "train", "va": "dev", "te": "test"}
-        with io.open(fpath, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.rstrip().split("\t")
-                self.task_data[self.tok2split[line[0]]]["X"].append(line[-1].split())
-                self.task_data[self.tok2split[line[0]]]["id"].append(line[1])
-                self.task_data[self.tok2split[line[0]]]["y"].append(line[2])
-                self.task_data[self.tok2split[line[0]]]["head"].append(
-                    (int(line[3]), int(line[4]))
+        # labels are carried as integer codes into label_vocab
+        self.label_vocab = None
+
+        # the task may be stored in the shared corpus layout, as a memory-mappable
+        # binary directory and as a TSV file; the most recently written one is
+        # loaded, preferring them in that order if written at the same time
+        index_fpath = find_file(task_index_path(fpath))
+        corpus_fpath = shared_corpus_path(fpath)
+        binary_fpath = binary_dataset_path(fpath)
+        text_fpath = find_file(fpath)
+        candidates = []
+        if os.path.isfile(index_fpath) and os.path.isdir(corpus_fpath):
+            candidates.append(
+                (
+                    os.path.getmtime(index_fpath),
+                    index_fpath,
+                    lambda: self.loadSharedCorpusFile(index_fpath, corpus_fpath),
                 )
-                self.task_data[self.tok2split[line[0]]]["tail"].append(
-                    (int(line[5]), int(line[6]))
+            )
+        if os.path.isfile(os.path.join(binary_fpath, HEADER_FILE)):
+            candidates.append(
+                (
+                    os.path.getmtime(os.path.join(binary_fpath, HEADER_FILE)),
+                    binary_fpath,
+                    lambda: self.loadBinaryFile(binary_fpath),
                 )
-                self.task_data[self.tok2split[line[0]]]["ner"].append(line[7].split())
-                self.task_data[self.tok2split[line[0]]]["pos"].append(line[8].split())
-                self.task_data[self.tok2split[line[0]]]["dep"].append(line[9].split())
-                self.task_data[self.tok2split[line[0]]]["dep_head"].append(
-                    list(map(int, line[10].split()))
+            )
+        if os.path.isfile(text_fpath):
+            candidates.append(
+                (
+                    os.path.getmtime(text_fpath),
+                    text_fpath,
+                    lambda: self.loadTextFile(text_fpath),
                 )
+            )
+
+        if candidates:
+            # max() returns the first of several equally recent candidates
+            _, loaded_fpath, load = max(candidates, key=lambda candidate: candidate[0])
+            logging.info("Loading %s from %s", self.task, loaded_fpath)
+            load()
+        else:
+            self.loadTextFile(text_fpath)
+
+        for split_data in self.task_data.values():
+            if "corpus" in split_data:
+                continue
+            for column in ANNOTATION_COLUMNS:
+                if column not in self.columns:
+                    split_data[column] = [None] * len(split_data["y"])
+
+        if self.label_vocab is None:
+            self.encodeLabels()
+
+        # classes are the train labels in sorted order, mapped from the label codes
+        # with a single lookup table instead of one dict lookup per example
+        label_vocab = np.asarray(self.label_vocab)
+        train_codes = np.unique(
+            np.asarray(self.task_data["train"]["y"], dtype=np.int64)
+        )
+        train_codes = train_codes[np.argsort(label_vocab[train_codes], kind="stable")]
+        code2class = np.full(len(label_vocab), -1, dtype=np.int64)
+        code2class[train_codes] = np.arange(len(train_codes))
 
-        labels = sorted(np.unique(self.task_data["train"]["y"]))
-        self.tok2label = dict(zip(labels, range(len(labels))))
+        self.tok2label = dict(
+            zip(label_vocab[train_codes].tolist(), range(len(train_codes)))
+        )
         self.nclasses = len(self.tok2label)
 
         for split in self.task_data:
-            for i, y in enumerate(self.task_data[split]["y"]):
-                self.task_data[split]["y"][i] = self.tok2label[y]
+            y = code2class[np.asarray(self.task_data[split]["y"], dtype=np.int64)]
+            if (y < 0).any():
+                unknown = label_vocab[self.task_data[split]["y"][int(np.argmin(y))]]
+                raise KeyError(unknown)
+            self.task_data[split]["y"] = y.tolist()
+
+    def encodeLabels(self):
+        # replaces the label strings of all splits with codes, in one vectorized pass
+        labels = [
+            label for split in self.task_data for label in self.task_data[split]["y"]
+        ]
+        label_vocab, codes = np.unique(
+            np.asarray(labels, dtype=str), return_inverse=True
+        )
+        self.label_vocab = label_vocab.tolist()
+        codes = codes.tolist()
+        start = 0
+        for split in self.task_data:
+            end = start + len(self.task_data[split]["y"])
+            self.task_data[split]["y"] = codes[start:end]
+            start = end
+
+    def loadSharedCorpusFile(self, fpath, corpus_fpath):
+        mtime = os.path.getmtime(os.path.join(corpus_fpath, HEADER_FILE))
+        corpus = _load_shared_corpus(corpus_fpath, mtime)
+        indices = {split: [] for split in self.task_data}
+        labels = {split: [] for split in self.task_data}
+        with open_file(fpath, "r", encoding="utf-8") as f:
+            for line in f:
+                split, index, label = line.rstrip("\n").split("\t")
+                split = self.tok2split[split]
+                indices[split].append(int(index))
+                labels[split].append(label)
+        for split in self.task_data:
+            self.setCorpusSplit(
+                split, corpus, np.asarray(indices[split], dtype=np.int64), labels[split]
+            )
+
+    def loadBinaryFile(self, fpath):
+        corpus = ColumnarCorpus.load(fpath, mmap_mode="r")
+        self.label_vocab = corpus.vocabs["label"].idx2item
+
+        split_vocab = corpus.vocabs["split"]
+        splits = np.asarray(corpus.columns["split"])
+        codes = np.asarray(corpus.columns["label"])
+        for code, tok in enumerate(split_vocab):
+            indices = np.flatnonzero(splits == code)
+            self.setCorpusSplit(
+                self.tok2split[tok], corpus, indices, codes[indices].tolist()
+            )
+
+    def setCorpusSplit(self, split, corpus, indices, labels):
+        # the examples of a binary or shared task stay in the memory-mapped corpus
+        # and are decoded batch by batch in run()
+        self.task_data[split] = {"corpus": corpus, "indices": indices, "y": labels}
+
+    def corpusBatch(self, split_data, start, end):
+        batch = _decode_corpus(
+            split_data["corpus"].select(split_data["indices"][start:end]), self.columns
+        )
+        if batch["id"] is None:
+            batch["id"] = ["None"] * len(batch["X"])
+        for column in ANNOTATION_COLUMNS:
+            if column not in self.columns:
+                batch[column] = [None] * len(batch["X"])
+        return batch
+
+    def loadTextFile(self, fpath):
+        # field index and parser of each annotation column
+        parsers = {
+            "ner": (7, str.split),
+            "pos": (8, str.split),
+            "dep": (9, str.split),
+            "dep_head": (10, lambda field: list(map(int, field.split()))),
+        }
+        parsers = [(column, *parsers[column]) for column in self.columns]
+
+        with open_file(fpath, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip().split("\t")
+                split_data = self.task_data[self.tok2split[line[0]]]
+                split_data["X"].append(line[-1].split())
+                split_data["id"].append(line[1])
+                split_data["y"].append(line[2])
+                split_data["head"].append((int(line[3]), int(line[4])))
+                split_data["tail"].append((int(line[5]), int(line[6])))
+                for column, field, parse in parsers:
+                    split_data[column].append(parse(line[field]))
+
+    def runCorpusSplit(self, params, batcher, key, task_embed):
+        split_data = self.task_data[key]
+        corpus, indices = split_data["corpus"], split_data["indices"]
+        # Sort to reduce padding, by the same key as the examples of a TSV task
+        lengths = corpus.lengths[indices].tolist()
+        if corpus.ids is not None:
+            ids = [corpus.ids[i] for i in indices.tolist()]
+        else:
+            ids = ["None"] * len(indices)
+        order = sorted(range(len(indices)), key=lambda i: (lengths[i], ids[i]))
+        split_data["indices"] = indices[np.asarray(order, dtype=np.int64)]
+        split_data["y"] = [split_data["y"][i] for i in order]
+
+        task_embed[key]["X"] = []
+        for ii in range(0, len(order), params.batch_size):
+            batch = self.corpusBatch(split_data, ii, ii + params.batch_size)
+            embeddings = batcher(
+                params,
+                batch["X"],
+                batch["head"],
+                batch["tail"],
+                batch["ner"],
+                batch["pos"],
+                batch["dep"],
+                batch["dep_head"],
+                batch["id"],
+            )
+            task_embed[key]["X"].append(embeddings)
+        task_embed[key]["X"] = np.vstack(task_embed[key]["X"])
+        task_embed[key]["y"] = np.array(split_data["y"])
 
     def run(self, params, batcher):
         task_embed = {"train": {}, "dev": {}, "test": {}}
         bsize = params.batch_size
         logging.info("Computing embeddings for train/dev/test")
         for key in self.task_data:
+            if "corpus" in self.task_data[key]:
+                self.runCorpusSplit(params, batcher, key, task_embed)
+                continue
             # Sort to reduce padding
             sorted_data = sorted(
                 zip(
@@ -225,46 +504,48 @@ Surface Information
 
 
 class LengthEval(REPROBINGEval):
-    def __init__(self, task_path, seed=1111):
+    def __init__(self, task_path, seed=1111, columns=None):
         task_path = os.path.join(task_path, "sentence_length.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, "Length", task_path, seed)
+        REPROBINGEval.__init__(self, "Length", task_path, seed, columns)
 
 
 class EntityDistanceEval(REPROBINGEval):
-    def __init__(self, task_path, seed=1111):
+    def __init__(self, task_path, seed=1111, columns=None):
         task_path = os.path.join(task_path, "entity_distance.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, "EntityDistance", task_path, seed)
+        REPROBINGEval.__init__(self, "EntityDistance", task_path, seed, columns)
 
 
 class ArgumentOrderEval(REPROBINGEval):
-    def __init__(self, task_path, seed=1111):
+    def __init__(self, task_path, seed=1111, columns=None):
         task_path = os.path.join(task_path, "argument_order.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, "ArgumentOrder", task_path, seed)
+        REPROBINGEval.__init__(self, "ArgumentOrder", task_path, seed, columns)
 
 
 class EntityExistsBetweenHeadTailEval(REPROBINGEval):
-    def __init__(self, task_path, seed=1111):
+    def __init__(self, task_path, seed=1111, columns=None):
         task_path = os.path.join(task_path, "entity_exists_between_head_tail.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, "EntityExistsBetweenHeadTail", task_path, seed)
+        REPROBINGEval.__init__(
+            self, "EntityExistsBetweenHeadTail", task_path, seed, columns
+        )
 
 
 class EntityTypeCountBetweenHeadTailEval(REPROBINGEval):
-    def __init__(self, task_path, ner_tag="ORG", seed=1111):
+    def __init__(self, task_path, ner_tag="ORG", seed=1111, columns=None):
         task_path = os.path.join(
             task_path, f"entity_type_count_{ner_tag}_between_head_tail.txt"
         )
         # labels: bins
         REPROBINGEval.__init__(
-            self, f"EntityTypeCount{ner_tag}BetweenHeadTail", task_path, seed
+            self, f"EntityTypeCount{ner_tag}BetweenHeadTail", task_path, seed, columns
         )
 
 
 class PosTagArgPositionEval(REPROBINGEval):
-    def __init__(self, task_path, argument, position, seed=1111):
+    def __init__(self, task_path, argument, position, seed=1111, columns=None):
         task_path = os.path.join(task_path, f"pos_tag_{argument}_{position}.txt")
         # labels: bins
         REPROBINGEval.__init__(
@@ -272,33 +553,40 @@ class PosTagArgPositionEval(REPROBINGEval):
             f"PosTag{argument.capitalize()}{position.capitalize()}",
             task_path,
             seed,
+            columns,
         )
 
 
 class ArgumentTypeEval(REPROBINGEval):
-    def __init__(self, task_path, argument, seed=1111):
+    def __init__(self, task_path, argument, seed=1111, columns=None):
         task_path = os.path.join(task_path, f"argument_type_{argument}.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, f"ArgType{argument.capitalize()}", task_path, seed)
+        REPROBINGEval.__init__(
+            self, f"ArgType{argument.capitalize()}", task_path, seed, columns
+        )
 
 
 class TreeDepthEval(REPROBINGEval):
-    def __init__(self, task_path, seed=1111):
+    def __init__(self, task_path, seed=1111, columns=None):
         task_path = os.path.join(task_path, "tree_depth.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, "TreeDepth", task_path, seed)
+        REPROBINGEval.__init__(self, "TreeDepth", task_path, seed, columns)
 
 
 class SDPTreeDepthEval(REPROBINGEval):
-    def __init__(self, task_path, seed=1111):
+    def __init__(self, task_path, seed=1111, columns=None):
         task_path = os.path.join(task_path, "sdp_tree_depth.txt")
         # labels: bins
-        REPROBINGEval.__init__(self, "SDPTreeDepth", task_path, seed)
+        REPROBINGEval.__init__(self, "SDPTreeDepth", task_path, seed, columns)
 
 
 class ArgumentGrammaticalRoleEval(REPROBINGEval):
-    def __init__(self, task_path, argument, seed=1111):
+    def __init__(self, task_path, argument, seed=1111, columns=None):
         task_path = os.path.join(task_path, f"argument_{argument}_grammatical_role.txt")
         REPROBINGEval.__init__(
-            self, f"Argument{argument.capitalize()}GrammaticalRole", task_path, seed
+            self,
+            f"Argument{argument.capitalize()}GrammaticalRole",
+            task_path,
+            seed,
+            columns,
         )
@@ -1,38 +1,47 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable, Iterator
 
 import logging
+from reval.features import FeatureTable
 from reval.probing_tasks import probing_task_base
 from reval.probing_task_example import ProbingTaskExample
 
 logger = logging.getLogger(__name__)
 
 
+def get_label(example: Dict[str, Any]) -> str:
+    head_start, _ = example["head"]
+    tail_start, _ = example["tail"]
+    return "1" if tail_start < head_start else "0"
+
+
+def get_labels(features: FeatureTable) -> List[Optional[str]]:
+    """
+    Returns the labels of all examples of a feature table at once. Same as
+    get_label() for each example.
+    """
+    return [str(is_inverted) for is_inverted in features["argument_order"].tolist()]
+
+
 def generate_task_examples(
-    data: List[Dict[str, Any]], split: str
-) -> List[ProbingTaskExample]:
-
-    probing_examples = []
-
-    for example in data:
-        head_start, _ = example["head"]
-        tail_start, _ = example["tail"]
-        is_inverted = "1" if tail_start < head_start else "0"
-
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label=is_inverted,
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
+    data: Iterable[Dict[str, Any]], split: str
+) -> Iterator[ProbingTaskExample]:
+
+    for index, example in enumerate(data):
+        yield probing_task_base.task_example(
+            data, index, example, get_label(example), split
         )
-    return probing_examples
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    return get_label
+
+
+def create_batch_labeler(
+    features: List[FeatureTable],
+) -> Callable[[FeatureTable], List[Optional[str]]]:
+    return get_labels
 
 
 def generate(
@@ -40,7 +49,7 @@ def generate(
     test_data: List[Dict[str, Any]],
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
 
     return probing_task_base.generate(
         generate_task_examples, train_data, test_data, validation_size, validation_data
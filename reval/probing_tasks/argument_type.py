@@ -1,46 +1,69 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable, Iterator
 
 import logging
+from functools import partial
 from collections import Counter
 from reval.dataset_utils import train_val_split
+from reval.probing_tasks.probing_task_base import stream_task_examples, task_example
 from reval.probing_task_example import ProbingTaskExample
 
 logger = logging.getLogger(__name__)
 
 
+def get_label(
+    example: Dict[str, Any],
+    argument: str,
+    type2idx: [Dict[str, int]],
+    keep_types: List[str],
+) -> Optional[str]:
+    arg_type = example[f"{argument}_type"]
+
+    if keep_types and arg_type not in keep_types:
+        return None
+
+    return str(type2idx[arg_type])
+
+
 def generate_task_examples(
-    data: List[Dict[str, Any]],
+    data: Iterable[Dict[str, Any]],
     argument: str,
     type2idx: [Dict[str, int]],
     keep_types: List[str],
     split: str,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
 
-    arg_type_field = f"{argument}_type"
+    for index, example in enumerate(data):
+        label = get_label(example, argument, type2idx, keep_types)
 
-    probing_examples = []
+        if label is None:
+            continue
 
-    for example in data:
-        arg_type = example[arg_type_field]
+        yield task_example(data, index, example, label, split)
 
-        if keep_types and arg_type not in keep_types:
-            continue
 
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label=type2idx[arg_type],
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
-        )
-    return probing_examples
+def count_arg_types(datasets: List[Iterable[Dict[str, Any]]], argument: str) -> Counter:
+    all_arg_types = Counter()
+    for data in datasets:
+        for example in data:
+            field = f"{argument}_type"
+            all_arg_types.update([example[field]])
+    return all_arg_types
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+    argument: str,
+    keep_types: Optional[List[str]] = None,
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    if argument not in ["head", "tail"]:
+        raise ValueError(f"'{argument}' is not a valid argument.")
+
+    all_arg_types = count_arg_types(datasets, argument)
+    type2idx = {arg_type: i for i, arg_type in enumerate(list(all_arg_types))}
+
+    return partial(
+        get_label, argument=argument, type2idx=type2idx, keep_types=keep_types
+    )
 
 
 def generate(
@@ -50,7 +73,7 @@ def generate(
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
     keep_types: Optional[List[str]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
     logger.info(
         f"Generating dataset for probing task: ArgumentType{argument.capitalize()}"
     )
@@ -66,41 +89,32 @@ def generate(
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    all_arg_types = Counter()
-    for data in [train_data, validation_data, test_data]:
-        for example in data:
-            field = f"{argument}_type"
-            all_arg_types.update([example[field]])
+    all_arg_types = count_arg_types([train_data, validation_data, test_data], argument)
 
     logger.info(f"Label distribution: {all_arg_types.most_common()}")
 
     type2idx = {arg_type: i for i, arg_type in enumerate(list(all_arg_types))}
 
-    task_examples = []
-
-    train_task_examples = generate_task_examples(
-        train_data, argument, type2idx, keep_types, split="tr"
-    )
-    task_examples.extend(train_task_examples)
-
-    idx2type = {v: k for k, v in type2idx.items()}
-    class_distribution = Counter(
-        [idx2type[example.label] for example in train_task_examples]
-    )
-    logger.info(f"CT: {class_distribution}")
-
-    validation_task_examples = generate_task_examples(
-        validation_data, argument, type2idx, keep_types, split="va"
+    idx2type = {str(v): k for k, v in type2idx.items()}
+
+    def train_task_examples() -> Iterator[ProbingTaskExample]:
+        # logs the class distribution of the train split once it has been generated
+        class_distribution = Counter()
+        for example in generate_task_examples(
+            train_data, argument, type2idx, keep_types, split="tr"
+        ):
+            class_distribution[idx2type[example.label]] += 1
+            yield example
+        logger.info(f"CT: {class_distribution}")
+
+    return stream_task_examples(
+        [
+            train_task_examples(),
+            generate_task_examples(
+                validation_data, argument, type2idx, keep_types, split="va"
+            ),
+            generate_task_examples(
+                test_data, argument, type2idx, keep_types, split="te"
+            ),
+        ]
     )
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(
-        test_data, argument, type2idx, keep_types, split="te"
-    )
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
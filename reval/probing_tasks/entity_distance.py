@@ -1,7 +1,15 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Callable, Iterator
 
 import logging
+from functools import partial
+from reval.bucketing import bucket_labels
+from reval.features import FeatureTable
 from reval.dataset_utils import train_val_split
+from reval.probing_tasks.probing_task_base import (
+    feature_batches,
+    labeled_task_examples,
+    stream_task_examples,
+)
 from reval.probing_task_example import ProbingTaskExample
 
 logger = logging.getLogger(__name__)
@@ -21,46 +29,55 @@ DEFAULT_BUCKETS = [
 ]
 
 
-def generate_task_examples(
-    data: List[Dict[str, Any]], buckets: List[Tuple[int, int]], split: str
-) -> List[ProbingTaskExample]:
-    def absolute_entity_dist_in_bucket(distance, bucket):
-        bucket_min, bucket_max = bucket
-        return bucket_min <= distance <= bucket_max
-
-    probing_examples = []
-
-    for example in data:
-        head_start, head_end = example["head"]
-        tail_start, tail_end = example["tail"]
-        distance = (
-            tail_start - head_end if tail_start > head_end else head_start - tail_end
-        )
-        bucket_index = None
-        for idx, bucket in enumerate(buckets):
-            if absolute_entity_dist_in_bucket(distance, bucket):
-                bucket_index = idx
-                break
+def absolute_entity_dist_in_bucket(distance, bucket):
+    bucket_min, bucket_max = bucket
+    return bucket_min <= distance <= bucket_max
+
+
+def get_label(example: Dict[str, Any], buckets: List[Tuple[int, int]]) -> Optional[str]:
+    head_start, head_end = example["head"]
+    tail_start, tail_end = example["tail"]
+    distance = tail_start - head_end if tail_start > head_end else head_start - tail_end
+    for idx, bucket in enumerate(buckets):
+        if absolute_entity_dist_in_bucket(distance, bucket):
+            return str(idx)
+    return None
+
+
+def get_labels(
+    features: FeatureTable, buckets: List[Tuple[int, int]]
+) -> List[Optional[str]]:
+    """
+    Returns the labels of all examples of a feature table, assigning the buckets
+    for all of them at once. Same as get_label() for each example.
+    """
+    return bucket_labels(features["entity_distance"], buckets)
+
 
+def generate_task_examples(
+    data: Iterable[Dict[str, Any]], buckets: List[Tuple[int, int]], split: str
+) -> Iterator[ProbingTaskExample]:
+    for batch, features in feature_batches(data):
         # discard examples that are either to long or to short
-        if bucket_index is None:
-            continue
-
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label=str(bucket_index),
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
-        )
-    return probing_examples
+        yield from labeled_task_examples(batch, get_labels(features, buckets), split)
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+    buckets: Optional[List[Tuple[int, int]]] = None,
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    if buckets is None:
+        buckets = DEFAULT_BUCKETS
+    return partial(get_label, buckets=buckets)
+
+
+def create_batch_labeler(
+    features: List[FeatureTable],
+    buckets: Optional[List[Tuple[int, int]]] = None,
+) -> Callable[[FeatureTable], List[Optional[str]]]:
+    if buckets is None:
+        buckets = DEFAULT_BUCKETS
+    return partial(get_labels, buckets=buckets)
 
 
 def generate(
@@ -69,7 +86,7 @@ def generate(
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
     buckets: Optional[List[Tuple[int, int]]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
     logger.info("Generating dataset for probing task: EntDist")
 
     if buckets is None:
@@ -84,21 +101,10 @@ def generate(
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    task_examples = []
-
-    train_task_examples = generate_task_examples(train_data, buckets, split="tr")
-    task_examples.extend(train_task_examples)
-
-    validation_task_examples = generate_task_examples(
-        validation_data, buckets, split="va"
+    return stream_task_examples(
+        [
+            generate_task_examples(train_data, buckets, split="tr"),
+            generate_task_examples(validation_data, buckets, split="va"),
+            generate_task_examples(test_data, buckets, split="te"),
+        ]
     )
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(test_data, buckets, split="te")
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable, Iterator
 
 import logging
 from reval.probing_tasks import probing_task_base
@@ -7,35 +7,30 @@ from reval.probing_task_example import ProbingTaskExample
 logger = logging.getLogger(__name__)
 
 
+def get_label(example: Dict[str, Any]) -> str:
+    head_start, head_end = example["head"]
+    tail_start, tail_end = example["tail"]
+    start = min(head_end, tail_end)
+    end = max(head_start, tail_start)
+
+    ner_tags = set(example["ner"][start + 1 : end]) - {"O"}
+    return "1" if len(ner_tags) > 0 else "0"
+
+
 def generate_task_examples(
-    data: List[Dict[str, Any]], split: str
-) -> List[ProbingTaskExample]:
-
-    probing_examples = []
-
-    for example in data:
-        head_start, head_end = example["head"]
-        tail_start, tail_end = example["tail"]
-        start = min(head_end, tail_end)
-        end = max(head_start, tail_start)
-
-        ner_tags = set(example["ner"][start + 1 : end]) - {"O"}
-
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label="1" if len(ner_tags) > 0 else "0",
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
+    data: Iterable[Dict[str, Any]], split: str
+) -> Iterator[ProbingTaskExample]:
+
+    for index, example in enumerate(data):
+        yield probing_task_base.task_example(
+            data, index, example, get_label(example), split
         )
-    return probing_examples
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    return get_label
 
 
 def generate(
@@ -43,7 +38,7 @@ def generate(
     test_data: List[Dict[str, Any]],
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
     logger.info("Generating dataset for probing task: EntExistsBetween")
 
     return probing_task_base.generate(
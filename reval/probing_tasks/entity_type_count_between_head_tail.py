@@ -1,7 +1,9 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable, Iterator
 
 import logging
+from functools import partial
 from reval.dataset_utils import train_val_split
+from reval.probing_tasks.probing_task_base import stream_task_examples, task_example
 from reval.probing_task_example import ProbingTaskExample
 
 logger = logging.getLogger(__name__)
@@ -14,35 +16,28 @@ def length_in_bucket(tags, bucket):
     return bucket_min <= len(tags) <= bucket_max
 
 
+def get_label(example: Dict[str, Any], tag: str) -> str:
+    head_start, head_end = example["head"]
+    tail_start, tail_end = example["tail"]
+    start = min(head_end, tail_end)
+    end = max(head_start, tail_start)
+
+    ner_tags = [t for t in example["ner"][start + 1 : end] if t == tag]
+    return str(min(len(ner_tags), MAX_COUNT))
+
+
 def generate_task_examples(
-    data: List[Dict[str, Any]], tag: str, split: str
-) -> List[ProbingTaskExample]:
-
-    probing_examples = []
-
-    for example in data:
-        head_start, head_end = example["head"]
-        tail_start, tail_end = example["tail"]
-        start = min(head_end, tail_end)
-        end = max(head_start, tail_start)
-
-        ner_tags = [t for t in example["ner"][start + 1 : end] if t == tag]
-
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label=str(len(ner_tags)) if len(ner_tags) < 5 else MAX_COUNT,
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
-        )
-    return probing_examples
+    data: Iterable[Dict[str, Any]], tag: str, split: str
+) -> Iterator[ProbingTaskExample]:
+
+    for index, example in enumerate(data):
+        yield task_example(data, index, example, get_label(example, tag), split)
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]], ner_count_tag: str = "ORGANIZATION"
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    return partial(get_label, tag=ner_count_tag)
 
 
 def generate(
@@ -51,7 +46,7 @@ def generate(
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
     ner_count_tag: str = "ORGANIZATION",
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
     logger.info("Generating dataset for probing task: EntCountBetween")
 
     if validation_data is None:
@@ -62,21 +57,10 @@ def generate(
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    task_examples = []
-
-    train_task_examples = generate_task_examples(train_data, ner_count_tag, split="tr")
-    task_examples.extend(train_task_examples)
-
-    validation_task_examples = generate_task_examples(
-        validation_data, ner_count_tag, split="va"
+    return stream_task_examples(
+        [
+            generate_task_examples(train_data, ner_count_tag, split="tr"),
+            generate_task_examples(validation_data, ner_count_tag, split="va"),
+            generate_task_examples(test_data, ner_count_tag, split="te"),
+        ]
     )
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(test_data, ner_count_tag, split="te")
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
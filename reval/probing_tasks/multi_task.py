@@ -0,0 +1,190 @@
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from reval.dataset_utils import train_val_split_indices, select_examples
+from reval.features import FeatureTable
+from reval.probing_task_example import ProbingTaskExample
+from reval.probing_tasks import (
+    get_probing_task_labeler,
+    get_probing_task_batch_labeler,
+)
+from reval.probing_tasks.probing_task_base import labeled_task_examples
+from reval.vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+SPLITS = ["tr", "va", "te"]
+
+# the datasets and feature tables of label_examples_parallel(), inherited by forked
+# worker processes
+_worker_datasets: Optional[List[Iterable[Dict[str, Any]]]] = None
+_worker_features: Optional[List[FeatureTable]] = None
+
+
+def label_examples(
+    datasets: List[Iterable[Dict[str, Any]]],
+    tasks: List[Dict[str, Any]],
+    features: Optional[List[FeatureTable]] = None,
+) -> List[List[List[Optional[str]]]]:
+    """
+    Labels the examples of all datasets for all tasks. Each task is a dict holding
+    the name of the probing_task and the arguments of its labeler. Tasks with a
+    batch labeler label each dataset at once from its FeatureTable (created if not
+    given), all others share a single sweep over the examples. Returns per task and
+    dataset the label of every example, None if the task discards it.
+    """
+    if features is None:
+        features = [FeatureTable(data) for data in datasets]
+
+    labels = [[] for _ in tasks]
+    labelers = {}
+    for t, task in enumerate(tasks):
+        task_kwargs = dict(task)
+        probing_task = task_kwargs.pop("probing_task")
+
+        create_batch_labeler = get_probing_task_batch_labeler(probing_task)
+        if create_batch_labeler is not None:
+            batch_labeler = create_batch_labeler(features, **task_kwargs)
+            labels[t] = [batch_labeler(table) for table in features]
+        else:
+            create_labeler = get_probing_task_labeler(probing_task)
+            labelers[t] = create_labeler(datasets, **task_kwargs)
+
+    for t in labelers:
+        labels[t] = [[] for _ in datasets]
+    for i, data in enumerate(datasets):
+        for example in data:
+            for t, labeler in labelers.items():
+                labels[t][i].append(labeler(example))
+    return labels
+
+
+def _init_worker(
+    datasets: List[Iterable[Dict[str, Any]]], features: List[FeatureTable]
+) -> None:
+    global _worker_datasets, _worker_features
+    _worker_datasets, _worker_features = datasets, features
+
+
+def _label_task(task: Dict[str, Any]) -> List[List[Optional[str]]]:
+    return label_examples(_worker_datasets, [task], _worker_features)[0]
+
+
+def label_examples_parallel(
+    datasets: List[Iterable[Dict[str, Any]]],
+    tasks: List[Dict[str, Any]],
+    workers: int,
+    features: Optional[List[FeatureTable]] = None,
+) -> List[List[List[Optional[str]]]]:
+    """
+    Like label_examples(), but labels the tasks in a pool of worker processes. Where
+    fork is available the workers share the datasets with this process copy-on-write,
+    otherwise each worker receives a single copy of them on start-up. Only the labels
+    are sent back.
+    """
+    global _worker_datasets, _worker_features
+
+    if features is None:
+        features = [FeatureTable(data) for data in datasets]
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        _worker_datasets, _worker_features = datasets, features
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("fork")
+        )
+    else:
+        executor = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(datasets, features)
+        )
+
+    try:
+        with executor:
+            return list(executor.map(_label_task, tasks))
+    finally:
+        _worker_datasets, _worker_features = None, None
+
+
+def iter_task_examples(
+    datasets: List[Iterable[Dict[str, Any]]], labels: List[List[Optional[str]]]
+) -> Iterator[ProbingTaskExample]:
+    """
+    Yields the probing task examples of one task, given the labels returned for it by
+    label_examples(). The labels of all datasets are encoded with one label
+    Vocabulary, as by stream_task_examples().
+    """
+    label_vocab = Vocabulary()
+    for data, split, data_labels in zip(datasets, SPLITS, labels):
+        for example in labeled_task_examples(data, data_labels, split):
+            example.encode_label(label_vocab)
+            yield example
+
+
+def generate(
+    train_data: List[Dict[str, Any]],
+    test_data: List[Dict[str, Any]],
+    tasks: List[Dict[str, Any]],
+    validation_size: float = 0.1,
+    validation_data: Optional[List[Dict[str, Any]]] = None,
+    workers: int = 1,
+    features: Optional[List[FeatureTable]] = None,
+) -> List[Iterator[ProbingTaskExample]]:
+    """
+    Generates the datasets of several probing tasks at once. The data is split and
+    swept a single time for all tasks, the examples of each task are then produced
+    lazily, in the same order as the task's own generate() function produces them.
+    With workers > 1, the tasks are labeled in parallel worker processes.
+
+    features optionally holds the FeatureTable objects of train_data,
+    validation_data (None if not given) and test_data, e.g. with a cache_path.
+    """
+    logger.info(f"Generating datasets for {len(tasks)} probing tasks")
+
+    if features is None:
+        features = [
+            FeatureTable(data) if data is not None else None
+            for data in [train_data, validation_data, test_data]
+        ]
+    train_features, validation_features, test_features = features
+
+    if validation_data is None:
+        train_indices, validation_indices = train_val_split_indices(
+            train_data, validation_size
+        )
+        validation_data = select_examples(train_data, validation_indices)
+        train_data = select_examples(train_data, train_indices)
+        validation_features = train_features.select(validation_indices)
+        train_features = train_features.select(train_indices)
+
+    logger.info(f"Num train examples: {len(train_data)}")
+    logger.info(f"Num validation examples: {len(validation_data)}")
+    logger.info(f"Num test examples: {len(test_data)}")
+
+    # columnar corpora are not decoded up front: the examples are decoded only for
+    # per-example labelers, and the task examples carry the corpus ids
+    datasets = [train_data, validation_data, test_data]
+
+    features = [train_features, validation_features, test_features]
+    if workers > 1:
+        labels = label_examples_parallel(datasets, tasks, workers, features)
+    else:
+        labels = label_examples(datasets, tasks, features)
+
+    for task, task_labels in zip(tasks, labels):
+        num_task_examples = [
+            len(data_labels) - data_labels.count(None) for data_labels in task_labels
+        ]
+        class_distribution = Counter(
+            label for data_labels in task_labels for label in data_labels
+        )
+        del class_distribution[None]
+
+        logger.info(f"Probing task: {task}")
+        logger.info(f"Num train task examples: {num_task_examples[0]}")
+        logger.info(f"Num validation task examples: {num_task_examples[1]}")
+        logger.info(f"Num test task examples: {num_task_examples[2]}")
+        logger.info(f"Class distribution: {class_distribution.most_common()}")
+
+    return [iter_task_examples(datasets, task_labels) for task_labels in labels]
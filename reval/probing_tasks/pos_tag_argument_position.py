@@ -1,56 +1,150 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Callable, Iterator
 
 import logging
+import numpy as np
+from functools import partial
+from itertools import chain
 from collections import Counter
 from reval.dataset_utils import train_val_split
+from reval.features import FeatureTable, pos_tag_inventory
+from reval.probing_tasks.probing_task_base import (
+    feature_batches,
+    labeled_task_examples,
+    stream_task_examples,
+)
 from reval.probing_task_example import ProbingTaskExample
 
 logger = logging.getLogger(__name__)
 
 
+def get_label(
+    example: Dict[str, Any],
+    argument: str,
+    position: str,
+    pos2idx: [Dict[str, int]],
+    keep_tags: List[str],
+) -> Optional[str]:
+    entity_start, entity_end = example[argument]
+    pos = example["pos"]
+
+    if position == "left":
+        # no POS to the left of the entity
+        if entity_start == 0:
+            return None
+        pos_tag = pos[entity_start - 1]
+    else:
+        if entity_end == (len(pos) - 1):
+            return None
+        # TODO: make sure this holds for all datasets (end index inclusive)
+        pos_tag = pos[entity_end + 1]
+
+    if keep_tags and pos_tag not in keep_tags:
+        return None
+
+    return str(pos2idx[pos_tag])
+
+
+def pos_tag_label(
+    pos_tag: Optional[str], pos2idx: [Dict[str, int]], keep_tags: List[str]
+) -> Optional[str]:
+    if pos_tag is None or (keep_tags and pos_tag not in keep_tags):
+        return None
+    return str(pos2idx[pos_tag])
+
+
+def get_labels(
+    features: FeatureTable,
+    argument: str,
+    position: str,
+    pos2idx: [Dict[str, int]],
+    keep_tags: List[str],
+) -> List[Optional[str]]:
+    """
+    Returns the labels of all examples of a feature table at once. Same as
+    get_label() for each example.
+    """
+    name = f"{argument}_{position}_pos"
+    pos_tag_ids = features[name]
+    # the label of each POS tag id, and None for -1
+    labels = np.array(
+        [
+            pos_tag_label(pos_tag, pos2idx, keep_tags)
+            for pos_tag in features.vocabs[name].idx2item
+        ]
+        + [None],
+        dtype=object,
+    )
+    return labels[pos_tag_ids].tolist()
+
+
 def generate_task_examples(
-    data: List[Dict[str, Any]],
+    data: Iterable[Dict[str, Any]],
     argument: str,
     position: str,
     pos2idx: [Dict[str, int]],
     keep_tags: List[str],
     split: str,
-) -> List[ProbingTaskExample]:
-    probing_examples = []
-
-    for example in data:
-        entity_start, entity_end = example[argument]
-        pos = example["pos"]
-
-        if position == "left":
-            # no POS to the left of the entity
-            if entity_start == 0:
-                continue
-            pos_tag = pos[entity_start - 1]
-        else:
-            if entity_end == (len(pos) - 1):
-                continue
-            # TODO: make sure this holds for all datasets (end index inclusive)
-            pos_tag = pos[entity_end + 1]
-
-        if keep_tags and pos_tag not in keep_tags:
-            continue
-
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label=pos2idx[pos_tag],
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
-        )
-    return probing_examples
+    features: Optional[FeatureTable] = None,
+) -> Iterator[ProbingTaskExample]:
+    for batch, batch_features in feature_batches(data, features):
+        labels = get_labels(batch_features, argument, position, pos2idx, keep_tags)
+        yield from labeled_task_examples(batch, labels, split)
+
+
+def validate_arguments(argument: str, position: str) -> None:
+    if argument not in ["head", "tail"]:
+        raise ValueError(f"'{argument}' is not a valid argument.")
+
+    if position not in ["left", "right"]:
+        raise ValueError(f"'{position}' is not a valid position.")
+
+
+def pos_tag_index(pos_tag_lists: Iterable[List[str]]) -> Dict[str, int]:
+    """
+    Returns the index of the POS tags of the train, validation and test data, given
+    the distinct POS tags of each, in order of their first occurrence.
+    """
+    pos_tags = dict.fromkeys(chain.from_iterable(pos_tag_lists))
+    return {pos_tag: i for i, pos_tag in enumerate(pos_tags)}
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+    argument: str,
+    position: str,
+    keep_tags: Optional[List[str]] = None,
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    validate_arguments(argument, position)
+
+    pos2idx = pos_tag_index(pos_tag_inventory(data) for data in datasets)
+
+    return partial(
+        get_label,
+        argument=argument,
+        position=position,
+        pos2idx=pos2idx,
+        keep_tags=keep_tags,
+    )
+
+
+def create_batch_labeler(
+    features: List[FeatureTable],
+    argument: str,
+    position: str,
+    keep_tags: Optional[List[str]] = None,
+) -> Callable[[FeatureTable], List[Optional[str]]]:
+    validate_arguments(argument, position)
+
+    # the POS tags of each table are collected once, for all four argument positions
+    pos2idx = pos_tag_index(table.pos_tags() for table in features)
+
+    return partial(
+        get_labels,
+        argument=argument,
+        position=position,
+        pos2idx=pos2idx,
+        keep_tags=keep_tags,
+    )
 
 
 def generate(
@@ -61,17 +155,13 @@ def generate(
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
     keep_tags: Optional[List[str]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
     logger.info(
         "Generating dataset for probing task: "
         + f"PosTag{argument.capitalize()}{position.capitalize()}"
     )
 
-    if argument not in ["head", "tail"]:
-        raise ValueError(f"'{argument}' is not a valid argument.")
-
-    if position not in ["left", "right"]:
-        raise ValueError(f"'{position}' is not a valid position.")
+    validate_arguments(argument, position)
 
     if validation_data is None:
         train_data, validation_data = train_val_split(train_data, validation_size)
@@ -82,40 +172,54 @@ def generate(
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    all_pos_tags = Counter()
-    for data in [train_data, validation_data, test_data]:
-        for example in data:
-            all_pos_tags.update(example["pos"])
-
-    logger.info(f"Label distribution: {all_pos_tags}")
-
-    pos2idx = {pos_tag: i for i, pos_tag in enumerate(list(all_pos_tags))}
-
-    task_examples = []
-
-    train_task_examples = generate_task_examples(
-        train_data, argument, position, pos2idx, keep_tags, split="tr"
-    )
-    task_examples.extend(train_task_examples)
-
-    idx2pos = {v: k for k, v in pos2idx.items()}
-    class_distribution = Counter(
-        [idx2pos[example.label] for example in train_task_examples]
+    train_features, validation_features, test_features = [
+        FeatureTable(data) for data in [train_data, validation_data, test_data]
+    ]
+    pos2idx = pos_tag_index(
+        table.pos_tags()
+        for table in [train_features, validation_features, test_features]
     )
-    logger.info(f"CT: {class_distribution}")
 
-    validation_task_examples = generate_task_examples(
-        validation_data, argument, position, pos2idx, keep_tags, split="va"
+    logger.info(f"POS tag index: {pos2idx}")
+
+    idx2pos = {str(v): k for k, v in pos2idx.items()}
+
+    def train_task_examples() -> Iterator[ProbingTaskExample]:
+        # logs the class distribution of the train split once it has been generated
+        class_distribution = Counter()
+        for example in generate_task_examples(
+            train_data,
+            argument,
+            position,
+            pos2idx,
+            keep_tags,
+            split="tr",
+            features=train_features,
+        ):
+            class_distribution[idx2pos[example.label]] += 1
+            yield example
+        logger.info(f"CT: {class_distribution}")
+
+    return stream_task_examples(
+        [
+            train_task_examples(),
+            generate_task_examples(
+                validation_data,
+                argument,
+                position,
+                pos2idx,
+                keep_tags,
+                split="va",
+                features=validation_features,
+            ),
+            generate_task_examples(
+                test_data,
+                argument,
+                position,
+                pos2idx,
+                keep_tags,
+                split="te",
+                features=test_features,
+            ),
+        ]
     )
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(
-        test_data, argument, position, pos2idx, keep_tags, split="te"
-    )
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
@@ -1,19 +1,153 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Sequence, Tuple
 
 import logging
-from reval.dataset_utils import train_val_split
+from collections import Counter
+from itertools import islice
+from reval.corpus import ColumnarCorpus
+from reval.dataset_utils import (
+    train_val_split,
+    train_val_split_indices,
+    select_examples,
+)
+from reval.features import FeatureTable
 from reval.probing_task_example import ProbingTaskExample
+from reval.vocabulary import Vocabulary
 
 logger = logging.getLogger(__name__)
 
 
+# the number of examples labelled at a time when generating from a one-pass iterable
+DEFAULT_BATCH_SIZE = 10000
+
+
+def feature_batches(
+    data: Iterable[Dict[str, Any]],
+    features: Optional[FeatureTable] = None,
+    workers: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Tuple[Sequence[Dict[str, Any]], FeatureTable]]:
+    """
+    Yields data together with its FeatureTable, features if given, if data can be
+    iterated more than once (a list or a ColumnarCorpus). A one-pass iterable, e.g.
+    of a lazily loaded dataset, is instead split into consecutive batches of up to
+    batch_size examples, each with its own FeatureTable, so that it is labelled in
+    bounded memory.
+    """
+    if features is not None or isinstance(data, (list, ColumnarCorpus)):
+        if features is None:
+            features = FeatureTable(data, workers=workers)
+        yield data, features
+        return
+
+    examples = iter(data)
+    while True:
+        batch = list(islice(examples, batch_size))
+        if not batch:
+            return
+        yield batch, FeatureTable(batch, workers=workers)
+
+
+def split_train_data(
+    train_data: Sequence[Dict[str, Any]],
+    validation_size: float = 0.1,
+    train_features: Optional[FeatureTable] = None,
+) -> Tuple[Any, Any, Optional[FeatureTable], Optional[FeatureTable]]:
+    """
+    Splits train_data into train and validation data like train_val_split(), and
+    returns both together with their FeatureTable objects, selected from the
+    FeatureTable of train_data if given, else None.
+    """
+    train_indices, validation_indices = train_val_split_indices(
+        train_data, validation_size
+    )
+    train_data, validation_data = (
+        select_examples(train_data, train_indices),
+        select_examples(train_data, validation_indices),
+    )
+    if train_features is None:
+        return train_data, validation_data, None, None
+    return (
+        train_data,
+        validation_data,
+        train_features.select(train_indices),
+        train_features.select(validation_indices),
+    )
+
+
+def task_example(
+    data: Iterable[Dict[str, Any]],
+    index: int,
+    example: Dict[str, Any],
+    label: str,
+    split: str,
+) -> ProbingTaskExample:
+    """
+    Returns the task example of the example at index of data. If data is a
+    ColumnarCorpus, the example carries the integer ids of the corpus instead of the
+    strings of example.
+    """
+    if isinstance(data, ColumnarCorpus):
+        return ProbingTaskExample.from_corpus(data, index, label, split)
+    return ProbingTaskExample.from_example(example, label, split)
+
+
+def labeled_task_examples(
+    data: Sequence[Dict[str, Any]], labels: Iterable[Optional[str]], split: str
+) -> Iterator[ProbingTaskExample]:
+    """
+    Yields the task examples of data given the label of each example, skipping those
+    labelled None. The examples of a ColumnarCorpus are not decoded.
+    """
+    if isinstance(data, ColumnarCorpus):
+        for index, label in enumerate(labels):
+            if label is not None:
+                yield ProbingTaskExample.from_corpus(data, index, label, split)
+    else:
+        for example, label in zip(data, labels):
+            if label is not None:
+                yield ProbingTaskExample.from_example(example, label, split)
+
+
+def stream_task_examples(
+    split_task_examples: Iterable[Iterable[ProbingTaskExample]],
+) -> Iterator[ProbingTaskExample]:
+    """
+    Yields the task examples of the train, validation and test split in turn, and logs
+    the number of examples of each split once it is exhausted. The labels of all
+    splits are encoded with one label Vocabulary. Given lazy per-split generators,
+    the list of generated ProbingTaskExample objects is no longer materialised; the
+    input splits themselves are still held in memory.
+    """
+    label_vocab = Vocabulary()
+    for split_name, split_examples in zip(
+        ["train", "validation", "test"], split_task_examples
+    ):
+        num_task_examples = 0
+        for example in split_examples:
+            example.encode_label(label_vocab)
+            num_task_examples += 1
+            yield example
+        logger.info(f"Num {split_name} task examples: {num_task_examples}")
+
+
+def count_labels(
+    task_examples: Iterable[ProbingTaskExample], class_distribution: Counter
+) -> Iterator[ProbingTaskExample]:
+    """
+    Yields task_examples unchanged, counting their labels in class_distribution.
+    """
+    for example in task_examples:
+        class_distribution[example.decode("label")] += 1
+        yield example
+
+
 def generate(
     generate_task_examples,
     train_data: List[Dict[str, Any]],
     test_data: List[Dict[str, Any]],
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
 
     if validation_data is None:
         train_data, validation_data = train_val_split(train_data, validation_size)
@@ -22,19 +156,10 @@ def generate(
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    task_examples = []
-
-    train_task_examples = generate_task_examples(train_data, split="tr")
-    task_examples.extend(train_task_examples)
-
-    validation_task_examples = generate_task_examples(validation_data, split="va")
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(test_data, split="te")
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
+    return stream_task_examples(
+        [
+            generate_task_examples(train_data, split="tr"),
+            generate_task_examples(validation_data, split="va"),
+            generate_task_examples(test_data, split="te"),
+        ]
+    )
@@ -5,12 +5,20 @@
 @date: 19.02.19
 @author: leonhard.hennig@dfki.de
 """
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Callable, Iterator
 
 import logging
+from functools import partial
 from reval.probing_task_example import ProbingTaskExample
-from reval.dependency_graph_utils import dep_heads_to_tree
-from reval.dataset_utils import train_val_split
+from reval.features import FeatureTable
+from reval.dependency_arrays import DependencyPaths
+from reval.bucketing import bucket_labels
+from reval.probing_tasks.probing_task_base import (
+    feature_batches,
+    labeled_task_examples,
+    split_train_data,
+    stream_task_examples,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -22,46 +30,54 @@ def in_bucket(depth, bucket):
     return bucket_min <= depth <= bucket_max
 
 
+def get_label(example: Dict[str, Any], buckets: List[Tuple[int, int]]) -> Optional[str]:
+    paths = DependencyPaths(example["dep_head"])
+    depth = paths.pruned_height(example["head"], example["tail"], prune=0)
+    for idx, bucket in enumerate(buckets):
+        if in_bucket(depth, bucket):
+            return str(idx)
+    return None
+
+
+def get_labels(
+    features: FeatureTable, buckets: List[Tuple[int, int]]
+) -> List[Optional[str]]:
+    """
+    Returns the labels of all examples of a feature table, assigning the buckets
+    for all of them at once. Same as get_label() for each example.
+    """
+    return bucket_labels(features["sdp_tree_depth"], buckets)
+
+
 def generate_task_examples(
-    data: List[Dict[str, Any]], buckets: List[Tuple[int, int]], split: str
-) -> List[ProbingTaskExample]:
-
-    probing_examples = []
-
-    for example in data:
-        dep_heads = example["dep_head"]
-        dep_labels = example["dep"]
-        tree = dep_heads_to_tree(
-            dep_heads,
-            len(example["tokens"]),
-            example["head"],
-            example["tail"],
-            prune=0,
-            dep_labels=dep_labels,
-        )
-        bucket_index = None
-        for idx, (bucket_min, bucket_max) in enumerate(buckets):
-            if bucket_min <= tree.depth() <= bucket_max:
-                bucket_index = idx
-                break
+    data: Iterable[Dict[str, Any]],
+    buckets: List[Tuple[int, int]],
+    split: str,
+    workers: int = 1,
+    features: Optional[FeatureTable] = None,
+) -> Iterator[ProbingTaskExample]:
+    for batch, batch_features in feature_batches(data, features, workers):
         # discard examples that are too deep
-        if bucket_index is None:
-            continue
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens=example["tokens"],
-                label=str(bucket_index),
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
-        )
-    return probing_examples
+        labels = get_labels(batch_features, buckets)
+        yield from labeled_task_examples(batch, labels, split)
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+    buckets: Optional[List[Tuple[int, int]]] = None,
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    if buckets is None:
+        buckets = DEFAULT_BUCKETS
+    return partial(get_label, buckets=buckets)
+
+
+def create_batch_labeler(
+    features: List[FeatureTable],
+    buckets: Optional[List[Tuple[int, int]]] = None,
+) -> Callable[[FeatureTable], List[Optional[str]]]:
+    if buckets is None:
+        buckets = DEFAULT_BUCKETS
+    return partial(get_labels, buckets=buckets)
 
 
 def generate(
@@ -70,34 +86,37 @@ def generate(
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
     buckets: Optional[List[Tuple[int, int]]] = None,
-) -> List[ProbingTaskExample]:
+    workers: int = 1,
+    features: Optional[List[Optional[FeatureTable]]] = None,
+) -> Iterator[ProbingTaskExample]:
     logger.info("Generating dataset for probing task: SDPTreeDepth")
 
     if buckets is None:
         buckets = DEFAULT_BUCKETS
 
+    train_features, validation_features, test_features = features or [None] * 3
     if validation_data is None:
-        train_data, validation_data = train_val_split(train_data, validation_size)
+        (
+            train_data,
+            validation_data,
+            train_features,
+            validation_features,
+        ) = split_train_data(train_data, validation_size, train_features)
 
     logger.info(f"Num train examples: {len(train_data)}")
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    task_examples = []
-
-    train_task_examples = generate_task_examples(train_data, buckets, split="tr")
-    task_examples.extend(train_task_examples)
-
-    validation_task_examples = generate_task_examples(
-        validation_data, buckets, split="va"
+    return stream_task_examples(
+        [
+            generate_task_examples(
+                train_data, buckets, "tr", workers, features=train_features
+            ),
+            generate_task_examples(
+                validation_data, buckets, "va", workers, features=validation_features
+            ),
+            generate_task_examples(
+                test_data, buckets, "te", workers, features=test_features
+            ),
+        ]
     )
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(test_data, buckets, split="te")
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
@@ -1,7 +1,15 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Callable, Iterator
 
 import logging
+from functools import partial
+from reval.bucketing import bucket_labels
+from reval.features import FeatureTable
 from reval.dataset_utils import train_val_split
+from reval.probing_tasks.probing_task_base import (
+    feature_batches,
+    labeled_task_examples,
+    stream_task_examples,
+)
 from reval.probing_task_example import ProbingTaskExample
 
 logger = logging.getLogger(__name__)
@@ -33,42 +41,52 @@ DEFAULT_BUCKETS = [
 ]
 
 
-def generate_task_examples(
-    data: List[Dict[str, Any]], buckets: List[Tuple[int, int]], split: str
-) -> List[ProbingTaskExample]:
-    def length_in_bucket(tokens, bucket):
-        bucket_min, bucket_max = bucket
-        return bucket_min <= len(tokens) <= bucket_max
-
-    probing_examples = []
-
-    for example in data:
-        tokens = example["tokens"]
-        bucket_index = None
-        for idx, bucket in enumerate(buckets):
-            if length_in_bucket(tokens, bucket):
-                bucket_index = idx
-                break
+def length_in_bucket(tokens, bucket):
+    bucket_min, bucket_max = bucket
+    return bucket_min <= len(tokens) <= bucket_max
+
+
+def get_label(example: Dict[str, Any], buckets: List[Tuple[int, int]]) -> Optional[str]:
+    for idx, bucket in enumerate(buckets):
+        if length_in_bucket(example["tokens"], bucket):
+            return str(idx)
+    return None
+
+
+def get_labels(
+    features: FeatureTable, buckets: List[Tuple[int, int]]
+) -> List[Optional[str]]:
+    """
+    Returns the labels of all examples of a feature table, assigning the buckets
+    for all of them at once. Same as get_label() for each example.
+    """
+    return bucket_labels(features["n_tokens"], buckets)
+
 
+def generate_task_examples(
+    data: Iterable[Dict[str, Any]], buckets: List[Tuple[int, int]], split: str
+) -> Iterator[ProbingTaskExample]:
+    for batch, features in feature_batches(data):
         # discard examples that are either to long or to short
-        if bucket_index is None:
-            continue
-
-        probing_examples.append(
-            ProbingTaskExample(
-                tokens,
-                label=str(bucket_index),
-                split=split,
-                head=example["head"],
-                tail=example["tail"],
-                ner=example["ner"],
-                pos=example["pos"],
-                dep=example["dep"],
-                dep_head=example["dep_head"],
-                id=example["id"],
-            )
-        )
-    return probing_examples
+        yield from labeled_task_examples(batch, get_labels(features, buckets), split)
+
+
+def create_labeler(
+    datasets: List[Iterable[Dict[str, Any]]],
+    buckets: Optional[List[Tuple[int, int]]] = None,
+) -> Callable[[Dict[str, Any]], Optional[str]]:
+    if buckets is None:
+        buckets = DEFAULT_BUCKETS
+    return partial(get_label, buckets=buckets)
+
+
+def create_batch_labeler(
+    features: List[FeatureTable],
+    buckets: Optional[List[Tuple[int, int]]] = None,
+) -> Callable[[FeatureTable], List[Optional[str]]]:
+    if buckets is None:
+        buckets = DEFAULT_BUCKETS
+    return partial(get_labels, buckets=buckets)
 
 
 def generate(
@@ -77,7 +95,7 @@ def generate(
     validation_size: float = 0.1,
     validation_data: Optional[List[Dict[str, Any]]] = None,
     buckets: Optional[List[Tuple[int, int]]] = None,
-) -> List[ProbingTaskExample]:
+) -> Iterator[ProbingTaskExample]:
     logger.info("Generating dataset for probing task: SentLength")
 
     if buckets is None:
@@ -92,21 +110,10 @@ def generate(
     logger.info(f"Num validation examples: {len(validation_data)}")
     logger.info(f"Num test examples: {len(test_data)}")
 
-    task_examples = []
-
-    train_task_examples = generate_task_examples(train_data, buckets, split="tr")
-    task_examples.extend(train_task_examples)
-
-    validation_task_examples = generate_task_examples(
-        validation_data, buckets, split="va"
+    return stream_task_examples(
+        [
+            generate_task_examples(train_data, buckets, split="tr"),
+            generate_task_examples(validation_data, buckets, split="va"),
+            generate_task_examples(test_data, buckets, split="te"),
+        ]
     )
-    task_examples.extend(validation_task_examples)
-
-    test_task_examples = generate_task_examples(test_data, buckets, split="te")
-    task_examples.extend(test_task_examples)
-
-    logger.info(f"Num train task examples: {len(train_task_examples)}")
-    logger.info(f"Num validation task examples: {len(validation_task_examples)}")
-    logger.info(f"Num test task examples: {len(test_task_examples)}")
-
-    return task_examples
@@ -0,0 +1,47 @@
+from typing import List, Dict, Iterable, Iterator, Optional
+
+
+class Vocabulary(object):
+    """
+    Interns strings (tokens, tags, labels) to dense integer ids, assigned in order
+    of first occurrence.
+    """
+
+    def __init__(self, items: Optional[Iterable[str]] = None) -> None:
+        self.item2idx: Dict[str, int] = {}
+        self.idx2item: List[str] = []
+        if items is not None:
+            self.encode(items)
+
+    def add(self, item: str) -> int:
+        idx = self.item2idx.get(item)
+        if idx is None:
+            idx = len(self.idx2item)
+            self.item2idx[item] = idx
+            self.idx2item.append(item)
+        return idx
+
+    def encode(self, items: Iterable[str]) -> List[int]:
+        return [self.add(item) for item in items]
+
+    def decode(self, ids: Iterable[int]) -> List[str]:
+        idx2item = self.idx2item
+        return [idx2item[idx] for idx in ids]
+
+    def index(self, item: str) -> int:
+        return self.item2idx[item]
+
+    def __getitem__(self, idx: int) -> str:
+        return self.idx2item[idx]
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.item2idx
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.idx2item)
+
+    def __len__(self) -> int:
+        return len(self.idx2item)
+
+    def __repr__(self) -> str:
+        return f"Vocabulary(size={len(self)})"